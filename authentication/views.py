@@ -5,6 +5,7 @@ This module provides views for user authentication, including user logout and si
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout, login
 from django.conf import settings
+from booksblog.ratelimit import ratelimit
 from . import forms
 
 
@@ -13,6 +14,7 @@ def logout_user(request):
     return redirect("login")
 
 
+@ratelimit("signup")
 def signup_page(request):
     form = forms.SignupForm()
     if request.method == "POST":
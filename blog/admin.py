@@ -6,12 +6,20 @@ Admin Classes:
     - ReviewsAdmin: Customizes the display of Review model with ('ticket', 'rating', 'user', 'headline', 'body',
      'time_created')
     - UserFollowsAdmin: Customizes the display of UserFollows model with('user', 'followed_user')
+    - ArchivedTicket and ArchivedReview are displayed with TicketsAdmin and ReviewsAdmin.
+    - JobsAdmin: Customizes the display of Job model with ('name', 'status', 'attempts', 'run_after',
+     'time_created', 'time_done')
+
+Views:
+    - cache_stats_view: Displays the statistics of the two-tier caches of the serving process.
 
 """
 
 
 from django.contrib import admin
-from blog.models import Ticket, Review
+from django.template.response import TemplateResponse
+from booksblog.cache import cache_stats
+from blog.models import Ticket, Review, ArchivedTicket, ArchivedReview, Job
 from authentication.models import UserFollows
 
 
@@ -27,6 +35,23 @@ class UserFollowsAdmin(admin.ModelAdmin):
     list_display = ("user", "followed_user")
 
 
+class JobsAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_after", "time_created", "time_done")
+    list_filter = ("status", "name")
+
+
 admin.site.register(Ticket, TicketsAdmin)
 admin.site.register(Review, ReviewsAdmin)
 admin.site.register(UserFollows, UserFollowsAdmin)
+admin.site.register(ArchivedTicket, TicketsAdmin)
+admin.site.register(ArchivedReview, ReviewsAdmin)
+admin.site.register(Job, JobsAdmin)
+
+
+def cache_stats_view(request):
+    context = {
+        **admin.site.each_context(request),
+        "title": "Statistiques du cache",
+        "caches": cache_stats(),
+    }
+    return TemplateResponse(request, "admin/cache_stats.html", context)
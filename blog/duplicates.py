@@ -0,0 +1,80 @@
+"""
+This module finds the tickets whose image is a near duplicate of another image.
+
+Images are compared with their 64 bits difference hash (see blog/images.py). The hashes are indexed with
+multi-index hashing: each hash is split into four 16 bits bands stored in indexed columns. By the
+pigeonhole principle, two hashes differing by at most 3 bits have at least one identical band, so the
+candidates are found with one indexed lookup per band, then filtered on their exact Hamming distance.
+
+Functions:
+    - bands(value): Splits a 64 bits hash into its four 16 bits bands.
+    - hash_instance(ticket, value): Returns the unsaved TicketImageHash of a ticket.
+    - has_image(ticket): Tells whether a ticket has its own image, not the placeholder.
+    - index_ticket(ticket, value): Stores the image hash of a ticket.
+    - find_duplicates(value, exclude_id): Returns the tickets whose image hash is close to value.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import images
+from .models import Ticket, TicketImageHash
+
+PLACEHOLDER_IMAGE = "none.png"
+BANDS = 4
+BAND_BITS = 16
+MAX_DISTANCE = BANDS - 1
+
+
+def bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * band)) & mask for band in range(BANDS)]
+
+
+def _to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hash_instance(ticket, value):
+    return TicketImageHash(
+        ticket=ticket, value=_to_signed(value), **{f"band{band}": part for band, part in enumerate(bands(value))}
+    )
+
+
+def has_image(ticket):
+    return bool(ticket.image) and ticket.image.name != PLACEHOLDER_IMAGE
+
+
+def index_ticket(ticket, value=None):
+    """
+    Stores the image hash of ticket, computing it from the image file when value is not given.
+    """
+    if not has_image(ticket):
+        TicketImageHash.objects.filter(ticket=ticket).delete()
+        return
+    if value is None:
+        try:
+            value = images.dhash(ticket.image.path)
+        except OSError:
+            return
+    hash_instance(ticket, value).save()
+
+
+def find_duplicates(value, exclude_id=None):
+    """
+    Returns the tickets whose image hash is at most settings.DUPLICATE_IMAGE_MAX_DISTANCE bits away from value,
+    closest first.
+    """
+    max_distance = min(settings.DUPLICATE_IMAGE_MAX_DISTANCE, MAX_DISTANCE)
+    lookup = Q()
+    for band, part in enumerate(bands(value)):
+        lookup |= Q(**{f"band{band}": part})
+    candidates = TicketImageHash.objects.filter(lookup).exclude(ticket_id=exclude_id).values_list("ticket_id", "value")
+    distances = {ticket_id: (_to_unsigned(candidate) ^ value).bit_count() for ticket_id, candidate in candidates}
+    close = {ticket_id: distance for ticket_id, distance in distances.items() if distance <= max_distance}
+    tickets = Ticket.objects.filter(id__in=close).select_related("user")
+    return sorted(tickets, key=lambda ticket: close[ticket.id])
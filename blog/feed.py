@@ -0,0 +1,121 @@
+"""
+This module builds and renders the feeds of tickets and reviews shown by the home and posts pages.
+
+Feeds are never loaded as a whole: each queryset is read in chunks with .iterator() and the sorted
+querysets are merged lazily. The page can then be rendered at once, or streamed: the page header is
+sent immediately, followed by the cards as they are read from the database.
+
+Feeds are paginated by creation time: a page holds FEED_PAGE_SIZE items and links to the items created
+before its last one. Items older than the archive horizon may have been moved to the archive tables by
+the archive_posts command; these tables are only queried once a page goes past the recent items.
+
+Functions:
+    - archive_horizon(): Returns the date before which items may be archived.
+    - parse_cursor(request): Returns the creation time of the page cursor, or None.
+    - merge_by_time(*querysets): Lazily merges querysets into one sequence, newest first.
+    - feed_items(hot, archived, before): Lazily merges the hot and archived querysets of a feed.
+    - render_feed(request, template_name, card_template_name, items, context): Returns the feed page response.
+"""
+
+import heapq
+from datetime import timedelta
+from itertools import chain, islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import loader
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.safestring import mark_safe
+
+from booksblog.profiling import phase
+
+CARDS_PLACEHOLDER = mark_safe("<!--feed-cards-->")
+
+
+def archive_horizon():
+    return timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def parse_cursor(request):
+    """
+    Returns the creation time given in the 'before' query parameter, or None.
+    """
+    try:
+        return parse_datetime(request.GET.get("before", ""))
+    except ValueError:
+        return None
+
+
+def merge_by_time(*querysets):
+    """
+    Merges querysets into a single iterator of instances sorted by time_created, newest first.
+
+    The database is chosen when this function is called, so the queries still go to the database
+    routed for the current view when the iterator is consumed later on, during streaming.
+    """
+    iterators = [
+        queryset.using(queryset.db).order_by("-time_created").iterator(chunk_size=settings.FEED_CHUNK_SIZE)
+        for queryset in querysets
+    ]
+    return heapq.merge(*iterators, key=attrgetter("time_created"), reverse=True)
+
+
+def feed_items(hot, archived, before=None):
+    """
+    Merges the hot querysets and the archived querysets of a feed, newest first, created before 'before'.
+
+    Archived items are all older than the archive horizon, so the hot items created after the horizon come
+    first, and the archived querysets are only executed when the iteration goes past them.
+    """
+    if before is not None:
+        hot = [queryset.filter(time_created__lt=before) for queryset in hot]
+        archived = [queryset.filter(time_created__lt=before) for queryset in archived]
+    horizon = archive_horizon()
+    recent = merge_by_time(*[queryset.filter(time_created__gte=horizon) for queryset in hot])
+    older = merge_by_time(*[queryset.filter(time_created__lt=horizon) for queryset in hot], *archived)
+    return chain(recent, older)
+
+
+def _render_cards(request, card_template_name, items):
+    card_template = loader.get_template(card_template_name)
+    items = islice(items, settings.FEED_PAGE_SIZE)
+    count = 0
+    last = None
+    while True:
+        chunk = list(islice(items, settings.FEED_CARDS_PER_CHUNK))
+        if not chunk:
+            break
+        count += len(chunk)
+        last = chunk[-1]
+        with phase("templates.cards"):
+            html = "".join(card_template.render({"instance": instance, "user": request.user}) for instance in chunk)
+        yield html
+    if count == settings.FEED_PAGE_SIZE:
+        yield loader.render_to_string("blog/feed_next.html", {"before": last.time_created.isoformat()})
+
+
+def render_feed(request, template_name, card_template_name, items, context=None):
+    """
+    Renders template_name with a page of the cards of items in place of its {{ feed_cards }} variable.
+
+    When settings.FEED_STREAMING is enabled, returns a StreamingHttpResponse sending the page header first
+    and then the cards chunk by chunk, so neither the items nor the HTML are held in memory at once.
+    """
+    context = dict(context or {})
+    cards = _render_cards(request, card_template_name, items)
+    if not settings.FEED_STREAMING:
+        context["feed_cards"] = mark_safe("".join(cards))
+        return HttpResponse(loader.render_to_string(template_name, context, request))
+
+    context["feed_cards"] = CARDS_PLACEHOLDER
+    with phase("templates.page"):
+        header, footer = loader.render_to_string(template_name, context, request).split(CARDS_PLACEHOLDER, 1)
+
+    def stream():
+        yield header
+        yield from cards
+        yield footer
+
+    return StreamingHttpResponse(stream())
@@ -0,0 +1,147 @@
+"""
+This module caches the head of the home feed of each user.
+
+The head is the list of (time_created, model name, id) of the newest items of the feed, bounded to
+settings.FEED_CACHE_ITEMS. On the next visit only the items created after the newest cached one are
+queried, in a single query, and merged into the head. The items themselves are always read from the
+database, so edits show up immediately; entries whose item was deleted are dropped from the head, and
+those whose item was archived are read from the archive tables. Changing whom a user follows changes a
+version token stored in the cache, and the heads built with an older token are rebuilt from scratch.
+
+Functions:
+    - suspended(): Context manager disabling the invalidations, e.g. while unfollowing many users at once.
+    - invalidate_user_feed(user_id): Forces the cached feed head of a user to be rebuilt.
+    - cached_feed_head(user, hot, archived): Returns the newest items of the home feed of user.
+"""
+
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import CharField, Value
+
+from . import feed
+
+_suspended = ContextVar("feed_cache_suspended", default=False)
+
+
+@contextmanager
+def suspended():
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def _cache():
+    return caches[settings.FEED_CACHE]
+
+
+def _head_key(user_id):
+    return f"feed:head:{user_id}"
+
+
+def _follows_key(user_id):
+    return f"feed:follows:{user_id}"
+
+
+def invalidate_user_feed(user_id):
+    if _suspended.get():
+        return
+    _cache().set(_follows_key(user_id), uuid.uuid4().hex, None)
+
+
+def _entry(instance):
+    return instance.time_created, instance._meta.model_name, instance.pk
+
+
+def _hydrate(entries, querysets):
+    """
+    Loads the instances of entries with the querysets, keyed by model name, keeping the order of entries.
+
+    Entries whose item was archived are loaded from the archive queryset, archived items keeping their id.
+    Entries whose item no longer exists are left out.
+    """
+    ids = {}
+    for _, model_name, pk in entries:
+        ids.setdefault(model_name, []).append(pk)
+    instances = {model_name: querysets[model_name].in_bulk(model_ids) for model_name, model_ids in ids.items()}
+    for model_name, model_ids in ids.items():
+        missing = [pk for pk in model_ids if pk not in instances[model_name]]
+        archive = querysets.get(f"archived{model_name}")
+        if missing and archive is not None:
+            instances[model_name].update(archive.in_bulk(missing))
+    return [instances[model_name][pk] for _, model_name, pk in entries if pk in instances[model_name]]
+
+
+def _new_entries(hot, since=None):
+    """
+    Returns the entries of the hot querysets created after since, with one UNION query.
+    """
+    if since is not None:
+        hot = [queryset.filter(time_created__gt=since) for queryset in hot]
+    queries = [
+        queryset.annotate(model_name=Value(queryset.model._meta.model_name, output_field=CharField()))
+        .values_list("time_created", "model_name", "pk")
+        .order_by()
+        for queryset in hot
+    ]
+    return list(queries[0].union(*queries[1:], all=True))
+
+
+def cached_feed_head(user, hot, archived):
+    """
+    Returns the newest items of the home feed of user, newest first.
+
+    hot and archived are the querysets of the feed, as given to feed.feed_items(). The head is rebuilt
+    when its version is outdated, otherwise only the items created since it was last updated are queried.
+    """
+    cache = _cache()
+    size = max(settings.FEED_CACHE_ITEMS, settings.FEED_PAGE_SIZE)
+    querysets = {queryset.model._meta.model_name: queryset for queryset in [*hot, *archived]}
+    values = cache.get_many([_head_key(user.pk), _follows_key(user.pk)])
+    version = values.get(_follows_key(user.pk), "")
+    head = values.get(_head_key(user.pk))
+
+    if head is None or head["version"] != version:
+        return _rebuild(user, hot, archived, version, size)
+
+    entries = head["entries"]
+    since = None
+    if entries:
+        # Items saved just before the head was built may be committed after it: look a little further back.
+        since = entries[0][0] - timedelta(seconds=settings.FEED_CACHE_OVERLAP_SECONDS)
+    new_entries = _new_entries(hot, since)
+    known = {(model_name, pk) for _, model_name, pk in entries}
+    new_entries = [entry for entry in new_entries if (entry[1], entry[2]) not in known]
+    if new_entries:
+        entries = sorted(new_entries + entries, key=lambda entry: entry[0], reverse=True)[:size]
+
+    # Loads a page of items, and more when some cached items were deleted in the meantime.
+    instances = []
+    loaded = 0
+    while len(instances) < settings.FEED_PAGE_SIZE and loaded < len(entries):
+        batch = entries[loaded : loaded + settings.FEED_PAGE_SIZE - len(instances)]
+        instances += _hydrate(batch, querysets)
+        loaded += len(batch)
+    changed = bool(new_entries)
+    if len(instances) < loaded:
+        if len(instances) < settings.FEED_PAGE_SIZE and len(entries) >= size:
+            # The head ran out of items but older ones may exist beyond it.
+            return _rebuild(user, hot, archived, version, size)
+        entries = [_entry(instance) for instance in instances] + entries[loaded:]
+        changed = True
+    if changed:
+        cache.set(_head_key(user.pk), {"version": version, "entries": entries}, None)
+    return instances
+
+
+def _rebuild(user, hot, archived, version, size):
+    instances = list(islice(feed.feed_items(hot, archived), size))
+    _cache().set(_head_key(user.pk), {"version": version, "entries": [_entry(i) for i in instances]}, None)
+    return instances[: settings.FEED_PAGE_SIZE]
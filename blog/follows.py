@@ -0,0 +1,70 @@
+"""
+This module follows and unfollows lists of users at once.
+
+The users are resolved with one query per batch of usernames and the UserFollows rows are inserted
+with bulk_create(ignore_conflicts=True), so following thousands of accounts costs a few queries.
+Batches keep each query below the SQLite limit on query parameters.
+
+Functions:
+    - parse_usernames(text): Returns the distinct usernames separated by commas, spaces or new lines.
+    - follow_users(user, usernames): Makes user follow the given users.
+    - unfollow_users(user, usernames): Makes user unfollow the given users.
+"""
+
+import re
+
+from authentication.models import User, UserFollows
+from . import feed_cache
+
+BATCH_SIZE = 900
+
+
+def parse_usernames(text):
+    return list(dict.fromkeys(name for name in re.split(r"[\s,;]+", text) if name))
+
+
+def _batches(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def _resolve(usernames):
+    users = {}
+    for batch in _batches(usernames):
+        users.update(User.objects.filter(username__in=batch).values_list("username", "pk"))
+    return users
+
+
+def follow_users(user, usernames):
+    """
+    Makes user follow every existing user of usernames, except themselves.
+
+    Returns a tuple (followed, missing): the usernames now followed and the usernames that do not exist.
+    """
+    users = _resolve(usernames)
+    users.pop(user.username, None)
+    UserFollows.objects.bulk_create(
+        [UserFollows(user=user, followed_user_id=pk) for pk in users.values()],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create() does not send post_save: invalidate the cached feed explicitly.
+    feed_cache.invalidate_user_feed(user.pk)
+    missing = [name for name in usernames if name not in users and name != user.username]
+    return list(users), missing
+
+
+def unfollow_users(user, usernames):
+    """
+    Makes user unfollow every user of usernames.
+
+    Returns the number of users unfollowed.
+    """
+    unfollowed = 0
+    # delete() sends post_delete for every row: invalidate the cached feed once, after the last batch.
+    with feed_cache.suspended():
+        for batch in _batches(usernames):
+            deleted, _ = UserFollows.objects.filter(user=user, followed_user__username__in=batch).delete()
+            unfollowed += deleted
+    feed_cache.invalidate_user_feed(user.pk)
+    return unfollowed
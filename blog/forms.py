@@ -9,9 +9,16 @@ Form Classes:
     - DeleteTicketForm: Form for confirming the deletion of a ticket.
     - TicketAndReviewForm: Form combining fields for both tickets and reviews.
     - UserFollowsForm: Form for following users.
+    - BulkUserFollowsForm: Form for following or unfollowing a list of users.
 """
 
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from booksblog.profiling import phase
+from . import duplicates
+from . import follows
+from . import images
 from . import models
 
 
@@ -76,6 +83,7 @@ class TicketForm(forms.ModelForm):
 
     ticket_edit = forms.BooleanField(widget=forms.HiddenInput, initial=True)
     ticket_type = forms.CharField(widget=forms.HiddenInput(), initial="CREATED")
+    ignore_duplicates = forms.BooleanField(required=False, widget=forms.HiddenInput, label="Publier quand même")
 
     class Meta:
         model = models.Ticket
@@ -84,6 +92,36 @@ class TicketForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["image"].required = False
+        self.image_hash = None
+        self.duplicates = []
+
+    def clean(self):
+        """
+        Looks for existing tickets with a near duplicate of the uploaded image.
+
+        Unless ignore_duplicates is checked, the form is invalid while such tickets exist, and they are
+        listed in self.duplicates so that the template can suggest them.
+        """
+        cleaned_data = super().clean()
+        image = cleaned_data.get("image")
+        if not isinstance(image, UploadedFile):
+            return cleaned_data
+        try:
+            with phase("pillow.dhash"):
+                self.image_hash = images.dhash(image)
+        except OSError:
+            return cleaned_data
+        finally:
+            image.seek(0)
+        self.duplicates = duplicates.find_duplicates(self.image_hash, exclude_id=self.instance.pk)
+        if self.duplicates:
+            self.fields["ignore_duplicates"].widget = forms.CheckboxInput()
+        if self.duplicates and not cleaned_data.get("ignore_duplicates"):
+            raise forms.ValidationError(
+                "Un ticket avec la même image existe déjà. Pour publier le vôtre, sélectionnez à nouveau l'image "
+                "et cochez « Publier quand même »."
+            )
+        return cleaned_data
 
 
 class DeleteTicketForm(forms.Form):
@@ -129,3 +167,28 @@ class UserFollowsForm(forms.Form):
     """
 
     username = forms.CharField(label="Nom de l'utilisateur")
+
+
+class BulkUserFollowsForm(forms.Form):
+    """
+    Form for following or unfollowing a list of users.
+
+    Attributes:
+        usernames: CharField (usernames separated by commas, spaces or new lines)
+        action: ChoiceField ('follow', 'unfollow')
+    """
+
+    ACTION_CHOICES = (
+        ("follow", "S'abonner"),
+        ("unfollow", "Se désabonner"),
+    )
+    usernames = forms.CharField(widget=forms.Textarea(attrs={"rows": 4}), label="Noms des utilisateurs")
+    action = forms.ChoiceField(choices=ACTION_CHOICES, initial="follow", label="Action")
+
+    def clean_usernames(self):
+        usernames = follows.parse_usernames(self.cleaned_data["usernames"])
+        if len(usernames) > settings.BULK_FOLLOW_MAX_USERNAMES:
+            raise forms.ValidationError(
+                f"Vous ne pouvez pas traiter plus de {settings.BULK_FOLLOW_MAX_USERNAMES} utilisateurs à la fois."
+            )
+        return usernames
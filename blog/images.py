@@ -0,0 +1,80 @@
+"""
+This module groups the image processing helpers used by the blog.
+
+The helpers work on plain file paths so they can run in worker processes without Django being set up.
+
+Functions:
+    - file_checksum(path): Returns the SHA-256 checksum of a file.
+    - resize_image(path, max_size): Resizes an image in place to fit within max_size.
+    - render_image(name, path, max_size, known_checksum): Resizes an image unless it was already processed.
+    - dhash(source): Returns the 64 bits difference hash of an image file or path.
+    - hash_image(key, path): Returns (key, difference hash) of the image at path, or (key, None).
+"""
+
+import hashlib
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resize_image(path, max_size):
+    # Pillow is imported on first use so that it is not loaded when the workers boot.
+    from PIL import Image
+
+    image = Image.open(path)
+    image.thumbnail(max_size)
+    image.save(path)
+
+
+def render_image(name, path, max_size, known_checksum=None):
+    """
+    Resizes the image stored at path, skipping it when its checksum matches the last processed one.
+
+    Returns a tuple (name, status, checksum) where status is 'skipped', 'processed', 'missing' or 'error'.
+    """
+    try:
+        checksum = file_checksum(path)
+        if checksum == known_checksum:
+            return name, "skipped", checksum
+        resize_image(path, max_size)
+        return name, "processed", file_checksum(path)
+    except FileNotFoundError:
+        return name, "missing", None
+    except Exception as error:
+        # Pillow also raises errors that are not OSError, such as DecompressionBombError: one bad image
+        # must not abort the whole run.
+        return name, "error", str(error)
+
+
+def dhash(source):
+    """
+    Returns the 64 bits difference hash (dHash) of an image, given as a path or a file object.
+
+    The image is reduced to 9x8 grey pixels and each bit tells whether a pixel is brighter than its right
+    neighbour, so resized or recompressed copies of an image get the same or a very close hash.
+    """
+    from PIL import Image
+
+    with Image.open(source) as image:
+        pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hash_image(key, path):
+    try:
+        return key, dhash(path)
+    except Exception:
+        return key, None
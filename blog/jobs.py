@@ -0,0 +1,134 @@
+"""
+This module implements the database-backed job queue of the project (transactional outbox).
+
+A job is a Job row written with enqueue() in the same transaction as the change that requires it, so the
+job exists if and only if the change is committed. The run_jobs command claims pending jobs and runs them
+on a thread pool. A claimed job is invisible to the other workers until its visibility timeout expires,
+so the jobs of a crashed worker are run again. Failed jobs are retried with an exponential backoff until
+settings.JOBS_MAX_ATTEMPTS is reached; a job whose last attempt never ended, for instance because it
+killed its worker, is marked as failed once its visibility timeout expires. Done jobs are deleted after
+settings.JOBS_KEEP_DONE_DAYS.
+
+Functions:
+    - job(name): Decorator registering a job handler under name.
+    - enqueue(name, **payload): Adds a job, in the current transaction.
+    - claim(limit): Claims up to limit jobs that are ready to run.
+    - run(job): Runs a claimed job and records its result.
+    - prune(): Deletes the old done jobs.
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def job(name):
+    def decorator(handler):
+        _handlers[name] = handler
+        return handler
+
+    return decorator
+
+
+def _job_model():
+    return apps.get_model("blog", "Job")
+
+
+def enqueue(name, **payload):
+    """
+    Adds the job name with its keyword arguments to the queue and returns it.
+
+    The job is committed with the current transaction. With settings.JOBS_RUN_EAGERLY, it is also run
+    right after the commit, in the request, which is convenient when no worker is running.
+    """
+    queued = _job_model().objects.create(name=name, payload=payload)
+    if settings.JOBS_RUN_EAGERLY:
+        transaction.on_commit(lambda: _run_eagerly(queued.pk))
+    return queued
+
+
+def _run_eagerly(job_id):
+    claimed = _claim_one(job_id, timezone.now())
+    if claimed:
+        run(claimed)
+
+
+def _unlocked(now):
+    return Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+
+
+def _ready(now):
+    Job = _job_model()
+    return Q(status=Job.PENDING, run_after__lte=now, attempts__lt=settings.JOBS_MAX_ATTEMPTS) & _unlocked(now)
+
+
+def _fail_abandoned(now):
+    Job = _job_model()
+    abandoned = Job.objects.filter(_unlocked(now), status=Job.PENDING, attempts__gte=settings.JOBS_MAX_ATTEMPTS)
+    abandoned.update(status=Job.FAILED, locked_until=None, last_error="The last attempt never finished.")
+
+
+def _claim_one(job_id, now):
+    Job = _job_model()
+    locked_until = now + timedelta(seconds=settings.JOBS_VISIBILITY_TIMEOUT)
+    # The conditional update only succeeds for one worker, even without row locks.
+    claimed = Job.objects.filter(_ready(now), pk=job_id).update(locked_until=locked_until, attempts=F("attempts") + 1)
+    return Job.objects.get(pk=job_id) if claimed else None
+
+
+def claim(limit):
+    """
+    Claims up to limit jobs ready to run, oldest first, and returns them.
+    """
+    now = timezone.now()
+    _fail_abandoned(now)
+    Job = _job_model()
+    candidates = Job.objects.filter(_ready(now)).order_by("run_after").values_list("pk", flat=True)[:limit]
+    return [claimed for claimed in (_claim_one(job_id, now) for job_id in candidates) if claimed]
+
+
+def _backoff(attempts):
+    delay = min(settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def run(claimed):
+    """
+    Runs a claimed job with its handler, then marks it as done, to retry later, or failed.
+    """
+    Job = _job_model()
+    try:
+        handler = _handlers[claimed.name]
+        handler(**claimed.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed.", claimed.pk, claimed.name)
+        now = timezone.now()
+        if claimed.attempts >= settings.JOBS_MAX_ATTEMPTS:
+            update = {"status": Job.FAILED}
+        else:
+            update = {"run_after": now + _backoff(claimed.attempts)}
+        Job.objects.filter(pk=claimed.pk).update(locked_until=None, last_error=traceback.format_exc(), **update)
+        return False
+    Job.objects.filter(pk=claimed.pk).update(status=Job.DONE, locked_until=None, time_done=timezone.now())
+    return True
+
+
+def prune():
+    """
+    Deletes the jobs done more than settings.JOBS_KEEP_DONE_DAYS days ago and returns their number.
+    """
+    Job = _job_model()
+    horizon = timezone.now() - timedelta(days=settings.JOBS_KEEP_DONE_DAYS)
+    deleted, _ = Job.objects.filter(status=Job.DONE, time_done__lt=horizon).delete()
+    return deleted
@@ -0,0 +1,61 @@
+"""
+This module defines the archive_posts management command.
+
+It moves the tickets older than settings.ARCHIVE_AFTER_DAYS, together with their reviews, from the Ticket
+and Review tables to the ArchivedTicket and ArchivedReview tables. A ticket is only archived once it and
+all of its reviews are older than the horizon, so the hot tables keep every item a feed shows before
+reaching the horizon. Each batch is moved in its own transaction. Archived items still count in the daily
+statistics of their authors, so these are not updated by the deletions.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from blog import rollups
+from blog.feed import archive_horizon
+from blog.models import ArchivedReview, ArchivedTicket, Review, Ticket
+
+TICKET_FIELDS = ["id", "title", "description", "user_id", "image", "uploader_id", "time_created", "ticket_type"]
+REVIEW_FIELDS = ["id", "ticket_id", "rating", "user_id", "headline", "body", "time_created"]
+
+
+class Command(BaseCommand):
+    help = "Moves the tickets and reviews older than ARCHIVE_AFTER_DAYS to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Tickets moved per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the tickets to archive.")
+
+    def handle(self, *args, **options):
+        horizon = archive_horizon()
+        eligible = (
+            Ticket.objects.filter(time_created__lt=horizon)
+            .exclude(Exists(Review.objects.filter(ticket=OuterRef("pk"), time_created__gte=horizon)))
+            .order_by("time_created")
+            .values_list("id", flat=True)
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"{eligible.count()} tickets à archiver.")
+            return
+
+        tickets_count = reviews_count = 0
+        while True:
+            with transaction.atomic():
+                ticket_ids = list(eligible[: options["batch_size"]])
+                if not ticket_ids:
+                    break
+                tickets = Ticket.objects.filter(id__in=ticket_ids).values(*TICKET_FIELDS)
+                reviews = Review.objects.filter(ticket_id__in=ticket_ids).values(*REVIEW_FIELDS)
+                ArchivedTicket.objects.bulk_create([ArchivedTicket(**ticket) for ticket in tickets])
+                archived_reviews = ArchivedReview.objects.bulk_create([ArchivedReview(**review) for review in reviews])
+                with rollups.suspended():
+                    Ticket.objects.filter(id__in=ticket_ids).delete()
+            tickets_count += len(ticket_ids)
+            reviews_count += len(archived_reviews)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{tickets_count} tickets et {reviews_count} reviews archivés avant le {horizon:%d/%m/%Y}."
+            )
+        )
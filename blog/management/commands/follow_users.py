@@ -0,0 +1,44 @@
+"""
+This module defines the follow_users management command.
+
+It imports a follow graph for a user: the usernames to follow (or unfollow with --unfollow) are read
+from a file, or from the standard input, separated by commas, spaces or new lines.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import User
+from blog import follows
+
+
+class Command(BaseCommand):
+    help = "Follows or unfollows a list of users on behalf of a user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User who follows the listed users.")
+        parser.add_argument("file", nargs="?", help="File containing the usernames, standard input by default.")
+        parser.add_argument("--unfollow", action="store_true", help="Unfollow the listed users instead.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"L'utilisateur {options['username']} n'existe pas.")
+
+        if options["file"]:
+            with open(options["file"], encoding="utf-8") as file:
+                usernames = follows.parse_usernames(file.read())
+        else:
+            usernames = follows.parse_usernames(sys.stdin.read())
+
+        if options["unfollow"]:
+            unfollowed = follows.unfollow_users(user, usernames)
+            self.stdout.write(self.style.SUCCESS(f"{user} s'est désabonné de {unfollowed} utilisateur(s)."))
+            return
+
+        followed, missing = follows.follow_users(user, usernames)
+        for username in missing:
+            self.stderr.write(f"Utilisateur introuvable : {username}")
+        self.stdout.write(self.style.SUCCESS(f"{user} est abonné à {len(followed)} utilisateur(s)."))
@@ -0,0 +1,69 @@
+"""
+This module defines the index_image_hashes management command.
+
+It computes the perceptual hash of the images of the existing tickets across a process pool and stores them,
+so that new uploads can be compared with them. Tickets already indexed are skipped unless --all is given.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import duplicates
+from blog.images import hash_image
+from blog.models import Ticket, TicketImageHash
+
+BATCH_SIZE = 500
+
+
+def _hash(job):
+    return hash_image(*job)
+
+
+class Command(BaseCommand):
+    help = "Computes the perceptual hashes of the images of the existing tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+        parser.add_argument("--all", action="store_true", help="Hash again the tickets already indexed.")
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.exclude(image="").exclude(image=duplicates.PLACEHOLDER_IMAGE)
+        if not options["all"]:
+            tickets = tickets.filter(image_hash__isnull=True)
+        media_root = str(settings.MEDIA_ROOT)
+        jobs = (
+            (ticket_id, os.path.join(media_root, name))
+            for ticket_id, name in tickets.values_list("id", "image").iterator()
+        )
+
+        indexed = failed = 0
+        batch = []
+        started = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            for ticket_id, value in executor.map(_hash, jobs, chunksize=32):
+                if value is None:
+                    failed += 1
+                    continue
+                batch.append(duplicates.hash_instance(Ticket(id=ticket_id), value))
+                if len(batch) >= BATCH_SIZE:
+                    indexed += self.save(batch)
+                    batch = []
+        indexed += self.save(batch)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"{indexed} images indexées, {failed} illisibles, en {elapsed:.1f}s.")
+        )
+
+    def save(self, batch):
+        TicketImageHash.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["ticket"],
+            update_fields=["value", "band0", "band1", "band2", "band3"],
+        )
+        return len(batch)
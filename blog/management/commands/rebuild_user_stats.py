@@ -0,0 +1,30 @@
+"""
+This module defines the rebuild_user_stats management command.
+
+It recomputes the daily activity statistics of the users (see blog/rollups.py) from their tickets and reviews,
+archived ones included, e.g. after items were imported with bulk_create, which sends no signal.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import User
+from blog import rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily activity statistics of the users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Users whose statistics are rebuilt, all by default.")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["usernames"]:
+            users = dict(User.objects.filter(username__in=options["usernames"]).values_list("username", "id"))
+            missing = set(options["usernames"]) - set(users)
+            if missing:
+                raise CommandError(f"Utilisateurs inconnus : {', '.join(sorted(missing))}.")
+            user_ids = list(users.values())
+
+        rows = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"{rows} jours d'activité recalculés."))
@@ -0,0 +1,94 @@
+"""
+This module defines the rerender_images management command.
+
+It reprocesses every ticket image with the current Ticket.IMAGE_MAX_SIZE across a process pool.
+Processed files are recorded with their checksum in a manifest stored in MEDIA_ROOT, so an interrupted
+run can be resumed and files that are already up to date are skipped.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.images import render_image
+from blog.models import Ticket
+
+MANIFEST_NAME = ".renditions.json"
+
+
+def load_manifest(path, spec):
+    try:
+        with open(path) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {"spec": spec, "files": {}}
+    if manifest.get("spec") != spec:
+        # The rendition settings changed: every file has to be processed again.
+        return {"spec": spec, "files": {}}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
+
+
+def _render(job):
+    return render_image(*job)
+
+
+class Command(BaseCommand):
+    help = "Reprocesses all ticket images in parallel with the current Ticket.IMAGE_MAX_SIZE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+        parser.add_argument("--chunk-size", type=int, default=16, help="Images sent to a worker at once.")
+        parser.add_argument("--force", action="store_true", help="Ignore the manifest and process every image.")
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        manifest_path = os.path.join(media_root, MANIFEST_NAME)
+        spec = {"max_size": list(Ticket.IMAGE_MAX_SIZE)}
+        manifest = {"spec": spec, "files": {}} if options["force"] else load_manifest(manifest_path, spec)
+        known = manifest["files"]
+
+        names = Ticket.objects.exclude(image="").values_list("image", flat=True).distinct().iterator()
+        jobs = (
+            (name, os.path.join(media_root, name), Ticket.IMAGE_MAX_SIZE, known.get(name))
+            for name in names
+        )
+
+        counts = {"processed": 0, "skipped": 0, "missing": 0, "error": 0}
+        started = time.monotonic()
+        try:
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                for index, (name, status, detail) in enumerate(
+                    executor.map(_render, jobs, chunksize=options["chunk_size"]), start=1
+                ):
+                    counts[status] += 1
+                    if status in ("processed", "skipped"):
+                        known[name] = detail
+                    else:
+                        self.stderr.write(f"{name}: {status} {detail or ''}".rstrip())
+                    if index % 500 == 0:
+                        save_manifest(manifest_path, manifest)
+                        self.stdout.write(f"{index} images traités...")
+        finally:
+            save_manifest(manifest_path, manifest)
+
+        elapsed = time.monotonic() - started
+        total = sum(counts.values())
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} images en {elapsed:.1f}s ({rate:.1f} images/s): "
+                f"{counts['processed']} traitées, {counts['skipped']} ignorées, "
+                f"{counts['missing']} manquantes, {counts['error']} en erreur."
+            )
+        )
@@ -0,0 +1,64 @@
+"""
+This module defines the run_jobs management command.
+
+It claims the pending jobs of the queue (see blog/jobs.py) and runs them on a pool of threads, until it
+is stopped with SIGINT or SIGTERM, or, with --once, until no job is ready anymore. The old done jobs are
+deleted when it starts, then every PRUNE_INTERVAL seconds.
+"""
+
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from blog import jobs
+
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Runs the jobs of the queue on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Number of jobs run at the same time.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between two polls.")
+        parser.add_argument("--once", action="store_true", help="Stop when no job is ready to run.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        threads = options["threads"]
+        counts = {True: 0, False: 0}
+        running = set()
+        pruned = None
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while not stop.is_set():
+                if pruned is None or time.monotonic() - pruned >= PRUNE_INTERVAL:
+                    jobs.prune()
+                    pruned = time.monotonic()
+                claimed = jobs.claim(threads - len(running)) if len(running) < threads else []
+                running |= {executor.submit(self.run_job, job) for job in claimed}
+                if not running:
+                    if options["once"]:
+                        break
+                    stop.wait(options["poll_interval"])
+                    continue
+                done, running = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts[future.result()] += 1
+            for future in wait(running).done:
+                counts[future.result()] += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{counts[True]} jobs terminés, {counts[False]} en échec."))
+
+    def run_job(self, job):
+        close_old_connections()
+        try:
+            return jobs.run(job)
+        finally:
+            connection.close()
@@ -0,0 +1,85 @@
+"""
+This module defines the startup_profile management command.
+
+It boots the WSGI application in a fresh interpreter started with "-X importtime", then reports the
+slowest imports, the import time per top-level package, the boot time and the peak memory of the
+process. The command fails when the boot exceeds settings.STARTUP_BUDGET_MS or
+settings.STARTUP_MEMORY_BUDGET_MB, so it can be used as a CI check.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT_SCRIPT = """
+import json, os, resource, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "booksblog.settings")
+from booksblog.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"boot_ms": boot_ms, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def parse_importtime(output):
+    """
+    Parses the "-X importtime" output into a list of (module, self_us, cumulative_us).
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = "Measures the import time per module and the memory of a freshly booted worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Number of modules listed.")
+        parser.add_argument("--budget-ms", type=float, default=settings.STARTUP_BUDGET_MS)
+        parser.add_argument("--memory-budget-mb", type=float, default=settings.STARTUP_MEMORY_BUDGET_MB)
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "booksblog.settings")
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Le démarrage a échoué:\n{result.stderr[-2000:]}")
+        boot = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(result.stderr)
+
+        self.stdout.write(f"Modules les plus lents (temps propre, {len(imports)} modules importés):")
+        for module, self_us, cumulative_us in sorted(imports, key=lambda i: i[1], reverse=True)[: options["top"]]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  (cumulé {cumulative_us / 1000:8.1f} ms)  {module}")
+
+        packages = defaultdict(int)
+        for module, self_us, _ in imports:
+            packages[module.split(".")[0]] += self_us
+        self.stdout.write("Temps d'import par paquet:")
+        for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[: options["top"]]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {package}")
+
+        boot_ms = boot["boot_ms"]
+        memory_mb = boot["max_rss_kb"] / 1024
+        self.stdout.write(f"Démarrage: {boot_ms:.0f} ms (budget {options['budget_ms']:.0f} ms)")
+        self.stdout.write(f"Mémoire: {memory_mb:.1f} Mo (budget {options['memory_budget_mb']:.0f} Mo)")
+
+        if boot_ms > options["budget_ms"] or memory_mb > options["memory_budget_mb"]:
+            raise CommandError("Le budget de démarrage est dépassé.")
+        self.stdout.write(self.style.SUCCESS("Budget de démarrage respecté."))
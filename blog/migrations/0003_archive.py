@@ -0,0 +1,74 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:01
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_alter_review_body_alter_review_headline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rating', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(5)])),
+                ('headline', models.CharField(max_length=128, verbose_name='titre')),
+                ('body', models.TextField(blank=True, max_length=1000, verbose_name='commentaires')),
+                ('time_created', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=128, verbose_name='titre')),
+                ('description', models.TextField(blank=True, max_length=1000, verbose_name='description')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='', verbose_name='image')),
+                ('time_created', models.DateTimeField()),
+                ('ticket_type', models.CharField(choices=[('CREATED', 'Critique'), ('REQUEST', 'Demande')], max_length=10)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-time_created'], name='blog_review_user_id_da5f6d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', '-time_created'], name='blog_ticket_user_id_393019_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedreview',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedticket',
+            name='uploader',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_uploaded_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedticket',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedreview',
+            name='ticket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog.archivedticket'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedticket',
+            index=models.Index(fields=['user', '-time_created'], name='blog_archiv_user_id_d61dca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedreview',
+            index=models.Index(fields=['user', '-time_created'], name='blog_archiv_user_id_8cd322_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['ticket', '-id'], name='blog_review_ticket__f0ca52_idx'),
+        ),
+    ]
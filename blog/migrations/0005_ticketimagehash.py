@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_review_ticket_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketImageHash',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='image_hash', serialize=False, to='blog.ticket')),
+                ('value', models.BigIntegerField()),
+                ('band0', models.PositiveIntegerField(db_index=True)),
+                ('band1', models.PositiveIntegerField(db_index=True)),
+                ('band2', models.PositiveIntegerField(db_index=True)),
+                ('band3', models.PositiveIntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_stats(apps, schema_editor):
+    Review = apps.get_model('blog', 'Review')
+    TicketRatingStats = apps.get_model('blog', 'TicketRatingStats')
+    counts = (
+        Review.objects.values('ticket_id')
+        .annotate(
+            rating_total=Sum('rating'),
+            **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in range(6)},
+        )
+        .order_by()
+    )
+    TicketRatingStats.objects.bulk_create(
+        [TicketRatingStats(**count) for count in counts.iterator()], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_userdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketRatingStats',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='blog.ticket')),
+                ('rating_0', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_rating_stats, migrations.RunPython.noop),
+    ]
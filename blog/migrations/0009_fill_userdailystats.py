@@ -0,0 +1,46 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:40
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def daily_counts(model, **aggregates):
+    return (
+        model.objects.annotate(day=TruncDate('time_created'))
+        .values('user_id', 'day')
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+
+def fill_user_stats(apps, schema_editor):
+    UserDailyStats = apps.get_model('blog', 'UserDailyStats')
+    rows = defaultdict(lambda: {'tickets': 0, 'reviews': 0, 'rating_total': 0})
+    for model_name in ('Ticket', 'ArchivedTicket'):
+        for count in daily_counts(apps.get_model('blog', model_name), count=Count('id')).iterator():
+            rows[count['user_id'], count['day']]['tickets'] += count['count']
+    for model_name in ('Review', 'ArchivedReview'):
+        model = apps.get_model('blog', model_name)
+        for count in daily_counts(model, count=Count('id'), rating_total=Sum('rating')).iterator():
+            row = rows[count['user_id'], count['day']]
+            row['reviews'] += count['count']
+            row['rating_total'] += count['rating_total']
+    UserDailyStats.objects.all().delete()
+    UserDailyStats.objects.bulk_create(
+        [UserDailyStats(user_id=user_id, day=day, **values) for (user_id, day), values in rows.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_ticketratingstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
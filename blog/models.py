@@ -4,13 +4,22 @@ This module defines Django models.
 Model Classes:
     - Ticket: Represents a ticket with associated information, including user, image, and ticket type.
     - Review: Represents a review associated with a ticket, including rating, user, and comments.
+    - ArchivedTicket: Ticket moved out of the Ticket table by the archive_posts command.
+    - ArchivedReview: Review moved out of the Review table together with its ticket.
+    - TicketImageHash: Perceptual hash of the image of a ticket, used to find duplicate tickets.
+    - Job: Deferred work written in the same transaction as the change requiring it.
+    - UserDailyStats: Number of tickets and reviews written by a user on a day, and the sum of their ratings.
+    - TicketRatingStats: Number of reviews of a ticket per rating, and the sum of their ratings.
 """
 
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
-from PIL import Image
+from django.utils import timezone
+from booksblog.profiling import phase
+from . import images
+from . import jobs
 
 
 class Ticket(models.Model):
@@ -30,7 +39,7 @@ class Ticket(models.Model):
     Methods:
         __str__(): Returns a string representation of the ticket, displaying its title.
         resize_image(): Resizes the uploaded image to fit within the specified maximum size.
-        save(): Overrides the save method to automatically trigger image resizing on every save.
+        save(): Overrides the save method to queue the resizing and hashing of the image on every save.
     """
 
     TICKET_TYPE_CHOICES = (
@@ -46,17 +55,20 @@ class Ticket(models.Model):
     ticket_type = models.CharField(max_length=10, choices=TICKET_TYPE_CHOICES)
     IMAGE_MAX_SIZE = (800, 800)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "-time_created"])]
+
     def __str__(self):
         return f"{self.title}"
 
     def resize_image(self):
-        image = Image.open(self.image)
-        image.thumbnail(self.IMAGE_MAX_SIZE)
-        image.save(self.image.path)
+        with phase("pillow.resize"):
+            images.resize_image(self.image.path, self.IMAGE_MAX_SIZE)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.resize_image()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            jobs.enqueue("process_ticket_image", ticket_id=self.pk)
 
 
 class Review(models.Model):
@@ -82,5 +94,190 @@ class Review(models.Model):
     body = models.TextField(max_length=1000, blank=True, verbose_name="commentaires")
     time_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-time_created"]),
+            models.Index(fields=["ticket", "-id"]),
+        ]
+
     def __str__(self):
         return f"Review for Ticket {self.ticket} by {self.user}"
+
+
+class TicketImageHash(models.Model):
+    """
+    Perceptual hash of the image of a ticket, used to find duplicate tickets.
+
+    The 64 bits hash is also split into four indexed 16 bits bands (multi-index hashing): two hashes
+    differing by at most 3 bits have at least one equal band, see blog/duplicates.py.
+
+    Attributes:
+        ticket: OneToOneField
+        value: BigIntegerField (signed 64 bits hash)
+        band0, band1, band2, band3: PositiveIntegerField
+    """
+
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name="image_hash")
+    value = models.BigIntegerField()
+    band0 = models.PositiveIntegerField(db_index=True)
+    band1 = models.PositiveIntegerField(db_index=True)
+    band2 = models.PositiveIntegerField(db_index=True)
+    band3 = models.PositiveIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Hash of {self.ticket}"
+
+
+class ArchivedTicket(models.Model):
+    """
+    Ticket moved out of the Ticket table by the archive_posts command, with its original id.
+
+    Archived tickets are read-only and only queried when a feed is paged past the archive horizon.
+
+    Attributes:
+        Same as Ticket.
+        model_type: Str, type displayed in the feeds.
+        archived: Bool
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=128, verbose_name="titre")
+    description = models.TextField(max_length=1000, blank=True, verbose_name="description")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_tickets")
+    image = models.ImageField(null=True, blank=True, verbose_name="image")
+    uploader = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_uploaded_tickets"
+    )
+    time_created = models.DateTimeField()
+    ticket_type = models.CharField(max_length=10, choices=Ticket.TICKET_TYPE_CHOICES)
+    model_type = "Ticket"
+    archived = True
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-time_created"])]
+
+    def __str__(self):
+        return f"{self.title}"
+
+
+class ArchivedReview(models.Model):
+    """
+    Review moved out of the Review table together with its ticket, with its original id.
+
+    Attributes:
+        Same as Review, ticket being an ArchivedTicket.
+        model_type: Str, type displayed in the feeds.
+        archived: Bool
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE)
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(0), MaxValueValidator(5)])
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_reviews")
+    headline = models.CharField(max_length=128, verbose_name="titre")
+    body = models.TextField(max_length=1000, blank=True, verbose_name="commentaires")
+    time_created = models.DateTimeField()
+    model_type = "Review"
+    archived = True
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-time_created"])]
+
+    def __str__(self):
+        return f"Review for Ticket {self.ticket} by {self.user}"
+
+
+class Job(models.Model):
+    """
+    Deferred work written in the same transaction as the change requiring it, run by the run_jobs command.
+
+    Attributes:
+        name: CharField, name of the handler registered with blog.jobs.job().
+        payload: JSONField, keyword arguments of the handler.
+        status: CharField ('PENDING', 'DONE', 'FAILED').
+        attempts: PositiveSmallIntegerField
+        run_after: DateTimeField, the job is not run before this time.
+        locked_until: DateTimeField, the job is claimed by a worker until this time.
+        last_error: TextField
+        time_created: DateTimeField
+        time_done: DateTimeField
+    """
+
+    PENDING = "PENDING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUS_CHOICES = (
+        (PENDING, "En attente"),
+        (DONE, "Terminé"),
+        (FAILED, "Échoué"),
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+    time_done = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class UserDailyStats(models.Model):
+    """
+    Number of tickets and reviews written by a user on a day, and the sum of the ratings given.
+
+    Rows are updated on each write by blog/rollups.py and can be rebuilt with the rebuild_user_stats command.
+
+    Attributes:
+        user: ForeignKey
+        day: DateField
+        tickets: PositiveIntegerField
+        reviews: PositiveIntegerField
+        rating_total: PositiveIntegerField
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    tickets = models.PositiveIntegerField(default=0)
+    reviews = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            "user",
+            "day",
+        )
+
+    def __str__(self):
+        return f"Stats of {self.user} on {self.day}"
+
+
+class TicketRatingStats(models.Model):
+    """
+    Number of reviews of a ticket per rating, and the sum of their ratings, for the ticket detail page.
+
+    Rows are updated on each write of a review by blog/reviews.py.
+
+    Attributes:
+        ticket: OneToOneField
+        rating_0, ..., rating_5: PositiveIntegerField
+        rating_total: PositiveIntegerField
+    """
+
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name="rating_stats")
+    rating_0 = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Ratings of {self.ticket}"
@@ -0,0 +1,131 @@
+"""
+This module reads the reviews of a ticket for the ticket detail page.
+
+The rating summary is read from the counters of the ticket (TicketRatingStats), updated on each write
+of a review, so it costs a single query whatever the number of reviews.
+
+Reviews are paginated by id (keyset pagination), so any page of a ticket with many reviews costs a
+single indexed query. Pages are cached with version tokens of the ticket: a new review only outdates
+the first page, since the pages after a given id do not change when reviews are added, while editing
+or deleting a review outdates every page.
+
+Functions:
+    - record_rating(ticket_id, rating, delta): Adds delta reviews with the given rating to the counters of a ticket.
+    - rebuild_rating_stats(): Recomputes the rating counters of every ticket.
+    - invalidate_first_page(ticket_id): Makes the cached first page of reviews of a ticket outdated.
+    - invalidate_ticket(ticket_id): Makes every cached page of reviews of a ticket outdated.
+    - rating_summary(ticket): Returns the number of reviews, the average rating and the count per rating.
+    - reviews_page(ticket, before_id): Returns a page of reviews and the id to continue from.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+
+from booksblog.cache import get_or_compute
+from .models import Review, TicketRatingStats
+
+RATINGS = range(5, -1, -1)
+
+
+def record_rating(ticket_id, rating, delta):
+    field = f"rating_{rating}"
+    if delta > 0:
+        stats, _ = TicketRatingStats.objects.get_or_create(ticket_id=ticket_id)
+        TicketRatingStats.objects.filter(pk=stats.pk).update(
+            **{field: F(field) + delta, "rating_total": F("rating_total") + rating * delta}
+        )
+    else:
+        # Only existing counters are decremented, never below zero: the ticket may be deleted with them.
+        TicketRatingStats.objects.filter(pk=ticket_id).update(
+            **{field: Greatest(F(field) + delta, 0), "rating_total": Greatest(F("rating_total") + rating * delta, 0)}
+        )
+
+
+def rebuild_rating_stats():
+    """
+    Recomputes the rating counters of every ticket from its reviews and returns the number of tickets.
+    """
+    counts = (
+        Review.objects.values("ticket_id")
+        .annotate(
+            rating_total=Sum("rating"),
+            **{f"rating_{rating}": Count("id", filter=Q(rating=rating)) for rating in RATINGS},
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        TicketRatingStats.objects.all().delete()
+        stats = TicketRatingStats.objects.bulk_create(
+            [TicketRatingStats(**count) for count in counts.iterator()], batch_size=500
+        )
+    return len(stats)
+
+
+def _version(key):
+    cache = caches[settings.TICKET_CACHE]
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _pages_key(ticket_id):
+    return f"ticket:{ticket_id}:version"
+
+
+def _first_page_key(ticket_id):
+    return f"ticket:{ticket_id}:first_page_version"
+
+
+def invalidate_first_page(ticket_id):
+    caches[settings.TICKET_CACHE].set(_first_page_key(ticket_id), uuid.uuid4().hex, None)
+
+
+def invalidate_ticket(ticket_id):
+    caches[settings.TICKET_CACHE].set_many(
+        {_pages_key(ticket_id): uuid.uuid4().hex, _first_page_key(ticket_id): uuid.uuid4().hex}, None
+    )
+
+
+def rating_summary(ticket):
+    """
+    Returns a dict with the number of reviews of ticket, their average rating and a list of (rating, count).
+    """
+    stats = TicketRatingStats.objects.filter(ticket=ticket).first() or TicketRatingStats(ticket=ticket)
+    ratings = [(rating, getattr(stats, f"rating_{rating}")) for rating in RATINGS]
+    count = sum(rating_count for _, rating_count in ratings)
+    return {"count": count, "average": stats.rating_total / count if count else None, "ratings": ratings}
+
+
+def reviews_page(ticket, before_id=None):
+    """
+    Returns the reviews of ticket with an id lower than before_id, newest first, with their users.
+
+    Returns a tuple (reviews, next_before_id), next_before_id being None on the last page.
+    """
+
+    def compute():
+        reviews = (
+            Review.objects.filter(ticket=ticket)
+            .select_related("user")
+            .only("rating", "headline", "body", "time_created", "ticket", "user__username")
+            .order_by("-id")
+        )
+        if before_id is not None:
+            reviews = reviews.filter(id__lt=before_id)
+        reviews = list(reviews[: settings.TICKET_REVIEWS_PAGE_SIZE + 1])
+        if len(reviews) > settings.TICKET_REVIEWS_PAGE_SIZE:
+            return reviews[:-1], reviews[-2].id
+        return reviews, None
+
+    key = f"ticket:{ticket.pk}:{_version(_pages_key(ticket.pk))}:reviews:{before_id}"
+    if before_id is None:
+        key = f"{key}:{_version(_first_page_key(ticket.pk))}"
+    return get_or_compute(key, compute, settings.TICKET_CACHE_TIMEOUT, alias=settings.TICKET_CACHE)
@@ -0,0 +1,87 @@
+"""
+This module maintains the daily activity statistics of the users (UserDailyStats).
+
+The rows are updated incrementally by the signal receivers of blog/signals.py when tickets and reviews are
+created, edited or deleted. rebuild() recomputes them from the tickets and reviews, archived ones included.
+
+Functions:
+    - suspended(): Context manager disabling the incremental updates, e.g. while archiving.
+    - record(user_id, time_created, tickets, reviews, rating_total): Adds the given deltas to a day of a user.
+    - rebuild(user_ids): Recomputes the statistics of the given users, or of every user.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedReview, ArchivedTicket, Review, Ticket, UserDailyStats
+
+_suspended = ContextVar("rollups_suspended", default=False)
+
+
+@contextmanager
+def suspended():
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def record(user_id, time_created, tickets=0, reviews=0, rating_total=0):
+    if _suspended.get():
+        return
+    day = timezone.localdate(time_created)
+    deltas = {"tickets": tickets, "reviews": reviews, "rating_total": rating_total}
+    if all(delta >= 0 for delta in deltas.values()):
+        stats, _ = UserDailyStats.objects.get_or_create(user_id=user_id, day=day)
+        UserDailyStats.objects.filter(pk=stats.pk).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+    else:
+        # Only existing rows are decremented, never below zero: the user may be deleted with their rows.
+        UserDailyStats.objects.filter(user_id=user_id, day=day).update(
+            **{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+        )
+
+
+def _daily_counts(queryset, **aggregates):
+    return (
+        queryset.annotate(day=TruncDate("time_created"))
+        .values("user_id", "day")
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+
+def rebuild(user_ids=None):
+    """
+    Recomputes the UserDailyStats of the users of user_ids, or of every user, and returns the number of rows.
+    """
+    rows = defaultdict(lambda: {"tickets": 0, "reviews": 0, "rating_total": 0})
+    for model in (Ticket, ArchivedTicket):
+        queryset = model.objects.all() if user_ids is None else model.objects.filter(user_id__in=user_ids)
+        for count in _daily_counts(queryset, count=Count("id")).iterator():
+            rows[count["user_id"], count["day"]]["tickets"] += count["count"]
+    for model in (Review, ArchivedReview):
+        queryset = model.objects.all() if user_ids is None else model.objects.filter(user_id__in=user_ids)
+        for count in _daily_counts(queryset, count=Count("id"), rating_total=Sum("rating")).iterator():
+            row = rows[count["user_id"], count["day"]]
+            row["reviews"] += count["count"]
+            row["rating_total"] += count["rating_total"]
+
+    with transaction.atomic():
+        existing = UserDailyStats.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing.delete()
+        UserDailyStats.objects.bulk_create(
+            [UserDailyStats(user_id=user_id, day=day, **values) for (user_id, day), values in rows.items()],
+            batch_size=500,
+        )
+    return len(rows)
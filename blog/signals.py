@@ -0,0 +1,83 @@
+"""
+This module defines the signal receivers of the blog application, connected in BlogConfig.ready().
+
+Receivers:
+    - invalidate_feed_on_follow: Rebuilds the cached feed of a user who follows or unfollows someone.
+    - invalidate_ticket_on_review: Outdates the cached reviews of a ticket when one of them changes.
+    - count_rating: Updates the rating counters of the ticket of a created, edited or deleted review.
+    - remember_previous_rating: Keeps the rating of a review before it is edited.
+    - count_ticket: Updates the daily statistics of the author of a created or deleted ticket.
+    - count_review: Updates the daily statistics of the author of a created, edited or deleted review.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from authentication.models import User, UserFollows
+from . import feed_cache
+from . import reviews
+from . import rollups
+from .models import Review, Ticket
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def invalidate_feed_on_follow(sender, instance, **kwargs):
+    feed_cache.invalidate_user_feed(instance.user_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_ticket_on_review(sender, instance, created=False, signal=None, **kwargs):
+    # A new review only changes the first page, the pages after a given review stay the same.
+    if created:
+        reviews.invalidate_first_page(instance.ticket_id)
+    else:
+        reviews.invalidate_ticket(instance.ticket_id)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list("rating", flat=True).first()
+
+
+def _deleting_user(origin):
+    # origin is the instance or queryset whose deletion cascaded to the deleted item.
+    return getattr(origin, "model", type(origin)) is User
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def count_ticket(sender, instance, created=False, signal=None, origin=None, **kwargs):
+    if created:
+        rollups.record(instance.user_id, instance.time_created, tickets=1)
+    elif signal is post_delete and not _deleting_user(origin):
+        rollups.record(instance.user_id, instance.time_created, tickets=-1)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def count_review(sender, instance, created=False, signal=None, origin=None, **kwargs):
+    if created:
+        rollups.record(instance.user_id, instance.time_created, reviews=1, rating_total=instance.rating)
+    elif signal is post_delete and not _deleting_user(origin):
+        rollups.record(instance.user_id, instance.time_created, reviews=-1, rating_total=-instance.rating)
+    else:
+        previous = getattr(instance, "_previous_rating", None)
+        if previous is not None and previous != instance.rating:
+            rollups.record(instance.user_id, instance.time_created, rating_total=instance.rating - previous)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def count_rating(sender, instance, created=False, signal=None, **kwargs):
+    if created:
+        reviews.record_rating(instance.ticket_id, instance.rating, 1)
+    elif signal is post_delete:
+        reviews.record_rating(instance.ticket_id, instance.rating, -1)
+    else:
+        previous = getattr(instance, "_previous_rating", None)
+        if previous is not None and previous != instance.rating:
+            reviews.record_rating(instance.ticket_id, previous, -1)
+            reviews.record_rating(instance.ticket_id, instance.rating, 1)
@@ -0,0 +1,21 @@
+"""
+This module defines the jobs of the blog application, run by the run_jobs command (see blog/jobs.py).
+
+Jobs:
+    - process_ticket_image(ticket_id): Resizes the image of a ticket and stores its perceptual hash.
+"""
+
+from . import duplicates
+from .jobs import job
+from .models import Ticket
+
+
+@job("process_ticket_image")
+def process_ticket_image(ticket_id):
+    ticket = Ticket.objects.filter(pk=ticket_id).first()
+    if ticket is None:
+        # The ticket was deleted or archived before the job ran.
+        return
+    if duplicates.has_image(ticket):
+        ticket.resize_image()
+    duplicates.index_ticket(ticket)
@@ -5,7 +5,7 @@ register = template.Library()
 
 @register.filter
 def model_type(instance):
-    return type(instance).__name__
+    return getattr(instance, "model_type", type(instance).__name__)
 
 
 @register.simple_tag(takes_context=True)
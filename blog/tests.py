@@ -1,3 +1,464 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from authentication.models import User, UserFollows
+from booksblog import cache, media, ratelimit, routers
+from . import duplicates, feed_cache, follows, images, jobs, reviews, rollups
+from .models import (
+    ArchivedReview,
+    ArchivedTicket,
+    Job,
+    Review,
+    Ticket,
+    TicketImageHash,
+    TicketRatingStats,
+    UserDailyStats,
+)
+
+
+class ImageHelpersTests(SimpleTestCase):
+    def setUp(self):
+        from PIL import Image
+
+        handle, self.path = tempfile.mkstemp(suffix=".png")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        Image.new("RGB", (300, 300)).save(self.path)
+
+    def test_render_image_reports_decompression_bombs_as_errors(self):
+        with mock.patch("PIL.Image.MAX_IMAGE_PIXELS", 100):
+            name, status, detail = images.render_image("big.png", self.path, (10, 10))
+        self.assertEqual((name, status), ("big.png", "error"))
+
+    def test_hash_image_returns_none_for_decompression_bombs(self):
+        with mock.patch("PIL.Image.MAX_IMAGE_PIXELS", 100):
+            self.assertEqual(images.hash_image(1, self.path), (1, None))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    # "replica" is not a configured database: any query sent to it fails, which is how these tests
+    # check that a request does not read from a replica.
+
+    def setUp(self):
+        self.user = User.objects.create_user("reader", "reader@example.com", "password1234")
+        self.followed = User.objects.create_user("followed", "followed@example.com", "password1234")
+
+    def read_database(self, method):
+        @routers.read_from_replica
+        def view(request):
+            return HttpResponse(Ticket.objects.all().db)
+
+        request = getattr(RequestFactory(), method)("/")
+        return view(request).content.decode()
+
+    def test_get_reads_from_replica(self):
+        self.assertEqual(self.read_database("get"), "replica")
+        self.assertEqual(self.read_database("head"), "replica")
+
+    def test_post_reads_from_primary(self):
+        self.assertEqual(self.read_database("post"), "default")
+
+    def test_subscribe_post_validates_against_primary(self):
+        UserFollows.objects.create(user=self.user, followed_user=self.followed)
+        self.client.force_login(self.user)
+        response = self.client.post("/subscribe/", {"username": "followed"})
+        self.assertContains(response, "Vous êtes déjà abonné à cet utilisateur.")
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        # The configured shared cache, in a temporary directory when it is file based.
+        shared = dict(settings.CACHES["shared"])
+        if shared["BACKEND"].endswith("FileBasedCache"):
+            shared["LOCATION"] = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, shared["LOCATION"])
+        settings_override = override_settings(CACHES={**settings.CACHES, "shared": shared}, RATELIMIT_CACHE="shared")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches["shared"].delete("ratelimit:test")
+
+    def test_client_ip_without_proxy_ignores_forwarded_for(self):
+        request = RequestFactory().post("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=0):
+            self.assertEqual(ratelimit.client_ip(request), "10.0.0.1")
+
+    def test_client_ip_behind_proxy_reads_forwarded_for(self):
+        request = RequestFactory().post("/", REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4")
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual(ratelimit.client_ip(request), "1.2.3.4")
+
+    def test_parallel_requests_share_the_bucket(self):
+        # Each request runs in its own process, as with the workers of the web server.
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(20)
+        results = context.Queue()
+
+        def request():
+            barrier.wait()
+            results.put(ratelimit.take_token("ratelimit:test", 5, 5 / 60))
+
+        backend = type(caches["shared"])
+        get = backend.get
+
+        def slow_get(instance, *args, **kwargs):
+            # Widens the window between reading and writing a bucket.
+            value = get(instance, *args, **kwargs)
+            time.sleep(0.005)
+            return value
+
+        with mock.patch.object(backend, "get", slow_get):
+            processes = [context.Process(target=request) for _ in range(20)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        self.assertEqual([results.get(timeout=5) for _ in processes].count(0), 5)
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+        settings_override = override_settings(CACHES={**settings.CACHES, "shared": backend})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_stale_value_is_served_while_another_process_recomputes(self):
+        caches["shared"].set("value", {"value": "stale", "delta": 1, "expires": time.time() - 1}, 60)
+        compute = mock.Mock(return_value="fresh")
+        with cache.shared_lock("value", "shared", wait=0) as acquired:
+            self.assertTrue(acquired)
+            self.assertEqual(cache.get_or_compute("value", compute, 60, alias="shared"), "stale")
+        compute.assert_not_called()
+        self.assertEqual(cache.get_or_compute("value", compute, 60, alias="shared"), "fresh")
+
+
+class SubscribeBulkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("follower", "follower@example.com", "password1234")
+        self.client.force_login(self.user)
+
+    def post_json(self, data):
+        return self.client.post("/subscribe/bulk/", json.dumps(data), content_type="application/json")
+
+    def test_usernames_must_be_a_list_of_strings(self):
+        for usernames in ("abc", ["abc", 1], {"abc": 1}):
+            with self.subTest(usernames=usernames):
+                self.assertEqual(self.post_json({"usernames": usernames}).status_code, 400)
+        self.assertFalse(UserFollows.objects.exists())
+
+    def test_follows_listed_users(self):
+        User.objects.create_user("alice", "alice@example.com", "password1234")
+        response = self.post_json({"usernames": ["alice", "nobody"]})
+        self.assertEqual(response.json(), {"followed": ["alice"], "missing": ["nobody"]})
+
+    def test_unfollowing_invalidates_the_feed_once(self):
+        usernames = [f"user{number}" for number in range(5)]
+        for username in usernames:
+            User.objects.create_user(username, f"{username}@example.com", "password1234")
+        follows.follow_users(self.user, usernames)
+        with mock.patch.object(feed_cache, "_cache") as backend:
+            self.assertEqual(follows.unfollow_users(self.user, usernames), 5)
+        self.assertEqual(backend.return_value.set.call_count, 1)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "feed"}},
+    FEED_CACHE="default",
+    FEED_PAGE_SIZE=3,
+    FEED_CACHE_ITEMS=4,
+)
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("reader", "reader@example.com", "password1234")
+        self.tickets = [
+            Ticket.objects.create(
+                title=f"Livre {number}",
+                description="",
+                image="none.png",
+                user=self.user,
+                uploader=self.user,
+                ticket_type="REQUEST",
+            )
+            for number in range(6)
+        ]
+        self.client.force_login(self.user)
+
+    def titles(self):
+        response = self.client.get("/home/")
+        content = b"".join(response.streaming_content).decode()
+        return [ticket.title for ticket in Ticket.objects.order_by("-time_created") if ticket.title in content]
+
+    def test_edit_is_shown_without_rebuilding_the_head(self):
+        self.titles()
+        self.tickets[5].title = "Livre modifié"
+        self.tickets[5].save()
+        with mock.patch.object(feed_cache, "_rebuild") as rebuild:
+            self.assertEqual(self.titles(), ["Livre modifié", "Livre 4", "Livre 3"])
+        rebuild.assert_not_called()
+
+    def test_deleted_items_are_replaced_by_the_next_cached_ones(self):
+        self.titles()
+        self.tickets[5].delete()
+        self.assertEqual(self.titles(), ["Livre 4", "Livre 3", "Livre 2"])
+
+    def test_head_is_rebuilt_when_it_runs_out_of_items(self):
+        self.titles()
+        for ticket in self.tickets[3:]:
+            ticket.delete()
+        self.assertEqual(self.titles(), ["Livre 2", "Livre 1", "Livre 0"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tickets"}},
+    TICKET_CACHE="default",
+    TICKET_REVIEWS_PAGE_SIZE=2,
+)
+class TicketReviewsTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("author", "author@example.com", "password1234")
+        self.ticket = Ticket.objects.create(
+            title="Livre", description="", image="none.png", user=self.user, uploader=self.user, ticket_type="REQUEST"
+        )
+
+    def review(self, rating):
+        return Review.objects.create(ticket=self.ticket, rating=rating, user=self.user, headline="", body="")
+
+    def test_summary_follows_created_edited_and_deleted_reviews(self):
+        self.review(5)
+        second = self.review(3)
+        second.rating = 1
+        second.save()
+        self.review(4).delete()
+        with self.assertNumQueries(1):
+            summary = reviews.rating_summary(self.ticket)
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["average"], 3)
+        self.assertEqual(dict(summary["ratings"]), {5: 1, 4: 0, 3: 0, 2: 0, 1: 1, 0: 0})
+
+    def test_new_review_keeps_the_following_pages_cached(self):
+        old = [self.review(rating) for rating in range(4)]
+        _, before_id = reviews.reviews_page(self.ticket)
+        reviews.reviews_page(self.ticket, before_id)
+        new = self.review(5)
+        with self.assertNumQueries(0):
+            self.assertEqual(reviews.reviews_page(self.ticket, before_id)[0], old[:2][::-1])
+        self.assertEqual(reviews.reviews_page(self.ticket)[0], [new, old[3]])
+
+    def test_deleting_the_ticket_deletes_its_counters(self):
+        self.review(5)
+        self.ticket.delete()
+        self.assertFalse(TicketRatingStats.objects.exists())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.job("test_job")(lambda: self.calls.append(1))
+
+    def test_job_that_never_finishes_fails_after_max_attempts(self):
+        queued = jobs.enqueue("test_job")
+        for _ in range(settings.JOBS_MAX_ATTEMPTS):
+            # The worker dies while running the job: its lock expires without any result.
+            self.assertEqual([claimed.pk for claimed in jobs.claim(10)], [queued.pk])
+            Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim(10), [])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, settings.JOBS_MAX_ATTEMPTS))
+
+    def test_prune_deletes_old_done_jobs(self):
+        old, recent, pending = jobs.enqueue("test_job"), jobs.enqueue("test_job"), jobs.enqueue("test_job")
+        horizon = timezone.now() - timedelta(days=settings.JOBS_KEEP_DONE_DAYS)
+        Job.objects.filter(pk=old.pk).update(status=Job.DONE, time_done=horizon - timedelta(hours=1))
+        Job.objects.filter(pk=recent.pk).update(status=Job.DONE, time_done=timezone.now())
+        self.assertEqual(jobs.prune(), 1)
+        self.assertCountEqual(Job.objects.values_list("pk", flat=True), [recent.pk, pending.pk])
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", "author@example.com", "password1234")
+        self.ticket = Ticket.objects.create(
+            title="Livre", description="", image="none.png", user=self.user, uploader=self.user, ticket_type="REQUEST"
+        )
+        self.review = Review.objects.create(ticket=self.ticket, rating=4, user=self.user, headline="", body="")
+
+    def totals(self):
+        return UserDailyStats.objects.filter(user=self.user).aggregate(
+            tickets=Sum("tickets"), reviews=Sum("reviews"), rating_total=Sum("rating_total")
+        )
+
+    def test_writes_update_the_daily_stats(self):
+        self.review.rating = 2
+        self.review.save()
+        self.assertEqual(self.totals(), {"tickets": 1, "reviews": 1, "rating_total": 2})
+
+    def test_deleting_a_ticket_written_before_the_stats_existed(self):
+        UserDailyStats.objects.all().delete()
+        self.ticket.delete()
+        self.assertEqual(self.totals(), {"tickets": None, "reviews": None, "rating_total": None})
+
+    def test_lowering_a_rating_given_before_the_stats_existed(self):
+        UserDailyStats.objects.all().delete()
+        self.review.rating = 1
+        self.review.save()
+        self.assertFalse(UserDailyStats.objects.exists())
+
+    def test_deleting_a_user_with_tickets(self):
+        rollups.rebuild()
+        self.user.delete()
+        self.assertFalse(UserDailyStats.objects.exists())
+
+
+class SignedMediaTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVE_MODE="accel")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = media.SignedMediaStorage()
+        self.path = os.path.join(media_root, "cover.png")
+        with open(self.path, "wb") as file:
+            file.write(b"original")
+
+    def test_rewritten_file_gets_a_new_url(self):
+        url = self.storage.url("cover.png")
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 1000))
+        self.assertNotEqual(self.storage.url("cover.png"), url)
+
+    def test_only_the_current_version_is_cached_as_immutable(self):
+        url = self.storage.url("cover.png")
+        self.assertIn("immutable", self.client.get(url)["Cache-Control"])
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 1000))
+        self.assertEqual(self.client.get(url)["Cache-Control"], "no-cache")
+
+    def test_tampered_url_is_refused(self):
+        url = self.storage.url("cover.png")
+        self.assertEqual(self.client.get(url.replace("v=", "v=1")).status_code, 403)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "archive"}},
+    FEED_CACHE="default",
+    TICKET_CACHE="default",
+)
+class ArchivePostsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", "author@example.com", "password1234")
+        old = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS + 10)
+        self.old_ticket = self.ticket("Livre ancien", old)
+        self.old_reviews = [self.review(self.old_ticket, f"Critique ancienne {number}", old) for number in range(2)]
+        self.kept_ticket = self.ticket("Livre encore commenté", old)
+        self.recent_review = self.review(self.kept_ticket, "Critique récente", timezone.now())
+        self.client.force_login(self.user)
+
+    def ticket(self, title, time_created):
+        ticket = Ticket.objects.create(
+            title=title, description="", image="none.png", user=self.user, uploader=self.user, ticket_type="REQUEST"
+        )
+        Ticket.objects.filter(pk=ticket.pk).update(time_created=time_created)
+        return ticket
+
+    def review(self, ticket, headline, time_created):
+        review = Review.objects.create(ticket=ticket, rating=3, user=self.user, headline=headline, body="")
+        Review.objects.filter(pk=review.pk).update(time_created=time_created)
+        return review
+
+    def test_old_tickets_and_their_reviews_are_moved(self):
+        call_command("archive_posts", stdout=io.StringIO())
+        self.assertFalse(Ticket.objects.filter(pk=self.old_ticket.pk).exists())
+        self.assertFalse(Review.objects.filter(pk__in=[review.pk for review in self.old_reviews]).exists())
+        self.assertEqual(ArchivedTicket.objects.get().pk, self.old_ticket.pk)
+        self.assertCountEqual(
+            ArchivedReview.objects.values_list("pk", flat=True), [review.pk for review in self.old_reviews]
+        )
+
+    def test_tickets_with_recent_reviews_are_kept(self):
+        call_command("archive_posts", stdout=io.StringIO())
+        self.assertTrue(Ticket.objects.filter(pk=self.kept_ticket.pk).exists())
+        self.assertTrue(Review.objects.filter(pk=self.recent_review.pk).exists())
+        self.assertFalse(ArchivedTicket.objects.filter(pk=self.kept_ticket.pk).exists())
+
+    def test_feeds_show_archived_items_past_the_horizon(self):
+        call_command("archive_posts", stdout=io.StringIO())
+        for url in ("/home/", "/posts/"):
+            with self.subTest(url=url):
+                response = self.client.get(url, {"before": timezone.now().isoformat()})
+                content = b"".join(response.streaming_content).decode()
+                self.assertIn("Livre ancien", content)
+                self.assertIn("Critique ancienne 0", content)
+                self.assertIn("Critique ancienne 1", content)
+                self.assertIn("Critique récente", content)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "duplicates"}},
+    FEED_CACHE="default",
+    TICKET_CACHE="default",
+    RATELIMIT_CACHE="default",
+)
+class DuplicateImageTests(TestCase):
+    # Top bit set: stored as a negative BigIntegerField.
+    VALUE = 0x8F0F_F0F0_1234_ABCD
+
+    def setUp(self):
+        self.user = User.objects.create_user("uploader", "uploader@example.com", "password1234")
+        self.ticket = Ticket.objects.create(
+            title="Ticket", image="none.png", ticket_type="REQUEST", user=self.user, uploader=self.user
+        )
+
+    def test_hash_with_top_bit_round_trips(self):
+        duplicates.hash_instance(self.ticket, self.VALUE).save()
+        stored = TicketImageHash.objects.get(ticket=self.ticket).value
+        self.assertLess(stored, 0)
+        self.assertEqual(duplicates._to_unsigned(stored), self.VALUE)
+        self.assertEqual(duplicates.find_duplicates(self.VALUE), [self.ticket])
+
+    def test_finds_hashes_at_most_three_bits_away(self):
+        duplicates.hash_instance(self.ticket, self.VALUE).save()
+        self.assertEqual(duplicates.find_duplicates(self.VALUE ^ 0b111), [self.ticket])
+        self.assertEqual(duplicates.find_duplicates(self.VALUE ^ 0b1111), [])
+        self.assertEqual(duplicates.find_duplicates(self.VALUE ^ (1 << 63 | 1 << 47 | 1 << 31 | 1 << 15)), [])
+
+    def test_form_rejects_a_duplicate_unless_ignored(self):
+        from PIL import Image
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        content = io.BytesIO()
+        Image.linear_gradient("L").rotate(30).save(content, "PNG")
+        self.client.force_login(self.user)
+
+        def post(**data):
+            image = SimpleUploadedFile("cover.png", content.getvalue(), content_type="image/png")
+            data = {"title": "Cover", "ticket_edit": True, "ticket_type": "CREATED", "image": image, **data}
+            return self.client.post("/ticket/create/", data)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            self.assertRedirects(post(), "/home/", fetch_redirect_response=False)
+            self.assertContains(post(), "Un ticket avec la même image existe déjà.")
+            self.assertRedirects(post(ignore_duplicates="on"), "/home/", fetch_redirect_response=False)
+        self.assertEqual(TicketImageHash.objects.count(), 2)
 
-# Create your tests here.
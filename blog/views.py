@@ -6,6 +6,7 @@ This module defines Django views.
     - review_create(request, ticket_id): Creates a new review for a specific ticket.
     - review_edit(request, review_id): Edits an existing review created by the logged-in user.
     - review_delete(request, review_id): Deletes an existing review created by the logged-in user.
+    - ticket_detail(request, ticket_id): Displays a ticket with its rating summary and paginated reviews.
     - ticket_create(request): Creates a new ticket.
     - ticket_request(request): Creates a new ticket of type 'REQUEST'.
     - ticket_edit(request, ticket_id): Edits an existing ticket created by the logged-in user.
@@ -13,67 +14,92 @@ This module defines Django views.
     - ticket_and_review(request): Creates a new ticket and an associated review.
     - subscribe(request): Handles user subscriptions.
     - unsubscribe(request): Handles user unsubscriptions.
+    - subscribe_bulk(request): Handles subscriptions and unsubscriptions to lists of users.
+    - stats(request): Displays the activity statistics of the logged-in user.
 """
 
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from authentication.models import User, UserFollows
+from booksblog.routers import read_from_replica, pin_to_primary
+from booksblog.ratelimit import ratelimit
 from django.contrib import messages
-from django.http import HttpResponseForbidden
+from django.db import transaction
+from django.http import HttpResponseForbidden, JsonResponse
+from . import duplicates
+from . import feed
+from . import feed_cache
+from . import follows
+from . import reviews
 from . import forms
 from . import models
-from django.db.models import Q
-from itertools import chain
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
 
 
 @login_required
+@read_from_replica
 def home(request):
     """
         Renders the home page (flux) displaying tickets and reviews from followed users.
 
-    Retrieves tickets and reviews from followed users and the current user, sorts them by creation time,
-    and renders the home page with the obtained data.
+    Retrieves tickets and reviews from followed users and the current user, merges them by creation time,
+    and streams the home page with the obtained data. The first page comes from the cached feed head.
     """
     following_users = UserFollows.objects.filter(user=request.user).values_list("followed_user", flat=True)
-    tickets = models.Ticket.objects.filter(Q(user__in=following_users) | Q(user=request.user)).distinct()
+    tickets = (
+        models.Ticket.objects.filter(Q(user__in=following_users) | Q(user=request.user))
+        .select_related("user")
+        .annotate(
+            user_has_reviewed_ticket=Exists(
+                models.Review.objects.filter(user=request.user, ticket=OuterRef("pk"))
+            )
+        )
+    )
     reviews = models.Review.objects.filter(
         Q(user__in=following_users) | Q(user=request.user) | Q(ticket__user=request.user)
-    ).distinct()
-    tickets_and_reviews = sorted(chain(tickets, reviews), key=lambda instance: instance.time_created,
-                                 reverse=True)
-
-    for instance in tickets_and_reviews:
-        if isinstance(instance, models.Ticket):  # Only check reviews for Ticket instances
-            instance.user_has_reviewed_ticket = models.Review.objects.filter(
-                user=request.user, ticket=instance
-            ).exists()
-    context = {
-        "tickets_and_reviews": tickets_and_reviews,
-    }
-    return render(request, "blog/home.html", context=context)
+    ).select_related("user", "ticket")
+    archived_tickets = models.ArchivedTicket.objects.filter(
+        Q(user__in=following_users) | Q(user=request.user)
+    ).select_related("user")
+    archived_reviews = models.ArchivedReview.objects.filter(
+        Q(user__in=following_users) | Q(user=request.user) | Q(ticket__user=request.user)
+    ).select_related("user", "ticket")
+    before = feed.parse_cursor(request)
+    if before is None:
+        tickets_and_reviews = feed_cache.cached_feed_head(
+            request.user, [tickets, reviews], [archived_tickets, archived_reviews]
+        )
+    else:
+        tickets_and_reviews = feed.feed_items([tickets, reviews], [archived_tickets, archived_reviews], before)
+    return feed.render_feed(request, "blog/home.html", "blog/home_card.html", tickets_and_reviews)
 
 
 @login_required
+@read_from_replica
 def posts(request):
     """
      Renders the posts page displaying tickets and reviews created by the logged-in user.
 
-    Retrieves tickets and reviews created by the logged-in user, sorts them by creation time,
-    and renders the posts page with the obtained data.
+    Retrieves tickets and reviews created by the logged-in user, merges them by creation time,
+    and streams the posts page with the obtained data.
 
     """
-    tickets = models.Ticket.objects.filter(user=request.user).distinct()
-    reviews = models.Review.objects.filter(Q(user=request.user)).distinct()
-    tickets_and_reviews = sorted(chain(tickets, reviews), key=lambda instance: instance.time_created,
-                                 reverse=True)
-
-    context = {
-        "tickets_and_reviews": tickets_and_reviews,
-    }
-    return render(request, "blog/posts.html", context=context)
+    tickets = models.Ticket.objects.filter(user=request.user).select_related("user")
+    reviews = models.Review.objects.filter(user=request.user).select_related("user", "ticket")
+    archived_tickets = models.ArchivedTicket.objects.filter(user=request.user).select_related("user")
+    archived_reviews = models.ArchivedReview.objects.filter(user=request.user).select_related("user", "ticket")
+    tickets_and_reviews = feed.feed_items(
+        [tickets, reviews], [archived_tickets, archived_reviews], before=feed.parse_cursor(request)
+    )
+    return feed.render_feed(request, "blog/posts.html", "blog/posts_card.html", tickets_and_reviews)
 
 
 @login_required
+@ratelimit("content")
 def review_create(request, ticket_id):
     """
     Handles the creation of a new review for a specific ticket.
@@ -93,6 +119,7 @@ def review_create(request, ticket_id):
             review.ticket = ticket
             review.user = request.user
             review.save()
+            pin_to_primary(request)
             return redirect("home")
     else:
         form = forms.ReviewForm()
@@ -114,6 +141,7 @@ def review_edit(request, review_id):
         form = forms.ReviewForm(request.POST, instance=review)
         if form.is_valid():
             form.save()
+            pin_to_primary(request)
             return redirect("posts")
     else:
         form = forms.ReviewForm(instance=review)
@@ -135,6 +163,7 @@ def review_delete(request, review_id):
         delete_form = forms.DeleteReviewForm(request.POST)
         if delete_form.is_valid():
             review.delete()
+            pin_to_primary(request)
             return redirect("posts")
     else:
         delete_form = forms.DeleteReviewForm()
@@ -147,6 +176,32 @@ def review_delete(request, review_id):
 
 
 @login_required
+@read_from_replica
+def ticket_detail(request, ticket_id):
+    """
+    Renders a ticket with the summary of its ratings and a page of its reviews.
+
+    Reviews are paginated with the 'before' query parameter, the id of the last review of the previous page.
+    The summary is read from the rating counters of the ticket, and the pages are cached.
+    """
+    ticket = get_object_or_404(models.Ticket.objects.select_related("user"), id=ticket_id)
+    try:
+        before_id = int(request.GET["before"])
+    except (KeyError, ValueError):
+        before_id = None
+    page, next_before_id = reviews.reviews_page(ticket, before_id)
+    context = {
+        "ticket": ticket,
+        "summary": reviews.rating_summary(ticket),
+        "reviews": page,
+        "next_before_id": next_before_id,
+        "user_has_reviewed_ticket": models.Review.objects.filter(user=request.user, ticket=ticket).exists(),
+    }
+    return render(request, "blog/ticket_detail.html", context)
+
+
+@login_required
+@ratelimit("content")
 def ticket_create(request):
     """
     Handles the creation of a new ticket.
@@ -163,7 +218,12 @@ def ticket_create(request):
             ticket.user = request.user
             ticket.uploader = request.user
             ticket.ticket_type = "CREATED"
-            ticket.save()
+            with transaction.atomic():
+                ticket.save()
+                if form.image_hash is not None:
+                    # Indexed right away, so that the same image uploaded again is caught before the job runs.
+                    duplicates.index_ticket(ticket, form.image_hash)
+            pin_to_primary(request)
             return redirect("home")
     else:
         form = forms.TicketForm()
@@ -171,6 +231,7 @@ def ticket_create(request):
 
 
 @login_required
+@ratelimit("content")
 def ticket_request(request):
     """
      Handles the creation of a new ticket of type 'REQUEST'.
@@ -186,7 +247,12 @@ def ticket_request(request):
             ticket.user = request.user
             ticket.uploader = request.user
             ticket.ticket_type = "REQUEST"
-            ticket.save()
+            with transaction.atomic():
+                ticket.save()
+                if form.image_hash is not None:
+                    # Indexed right away, so that the same image uploaded again is caught before the job runs.
+                    duplicates.index_ticket(ticket, form.image_hash)
+            pin_to_primary(request)
             return redirect("home")
     else:
         form = forms.TicketForm()
@@ -214,7 +280,11 @@ def ticket_edit(request, ticket_id):
             elif "image" in request.FILES:
                 # Update 'image' if a new file is provided
                 ticket.image = request.FILES["image"]
-            ticket.save()
+            with transaction.atomic():
+                ticket.save()
+                if edit_form.image_hash is not None:
+                    duplicates.index_ticket(ticket, edit_form.image_hash)
+            pin_to_primary(request)
             return redirect("posts")
     else:
         edit_form = forms.TicketForm(instance=ticket)
@@ -236,6 +306,7 @@ def ticket_delete(request, ticket_id):
         delete_form = forms.DeleteTicketForm(request.POST)
         if delete_form.is_valid():
             ticket.delete()
+            pin_to_primary(request)
             return redirect("posts")
     else:
         delete_form = forms.DeleteTicketForm()
@@ -248,6 +319,7 @@ def ticket_delete(request, ticket_id):
 
 
 @login_required
+@ratelimit("content")
 def ticket_and_review(request):
     """
     Handles the creation of a new ticket and an associated review.
@@ -265,12 +337,16 @@ def ticket_and_review(request):
             ticket.user = request.user
             ticket.uploader = request.user
             ticket.ticket_type = "CREATED"
-            ticket.save()
             review = review_form.save(commit=False)
-            review.ticket = ticket
             review.headline = ticket.title
             review.user = request.user
-            review.save()
+            with transaction.atomic():
+                ticket.save()
+                if ticket_form.image_hash is not None:
+                    duplicates.index_ticket(ticket, ticket_form.image_hash)
+                review.ticket = ticket
+                review.save()
+            pin_to_primary(request)
             return redirect("home")
     else:
         ticket_form = forms.TicketForm()
@@ -284,6 +360,7 @@ def ticket_and_review(request):
 
 
 @login_required
+@read_from_replica
 def subscribe(request):
     """
      Handles user subscriptions to other users.
@@ -301,6 +378,7 @@ def subscribe(request):
                     form.add_error("username", "Vous ne pouvez pas vous abonner à vous-même.")
                 elif not UserFollows.objects.filter(user=current_user, followed_user=user_to_follow).exists():
                     UserFollows.objects.create(user=current_user, followed_user=user_to_follow)
+                    pin_to_primary(request)
                     return redirect("subscribe")  # Redirigez vers la page suivante après l'abonnement
                 else:
                     form.add_error("username", "Vous êtes déjà abonné à cet utilisateur.")
@@ -310,8 +388,8 @@ def subscribe(request):
         form = forms.UserFollowsForm()
     following = UserFollows.objects.filter(user=current_user).values_list("followed_user__username", flat=True)
     followers = UserFollows.objects.filter(followed_user=current_user).values_list("user__username", flat=True)
-    return render(request, "blog/subscribe.html", {"form": form, "following": following,
-                                                   "followers": followers})
+    return render(request, "blog/subscribe.html", {"form": form, "bulk_form": forms.BulkUserFollowsForm(),
+                                                   "following": following, "followers": followers})
 
 
 @login_required
@@ -332,9 +410,92 @@ def unsubscribe(request):
                 user_to_unfollow = User.objects.get(username=unfollow_username)
                 if user_to_unfollow != current_user:
                     UserFollows.objects.filter(user=current_user, followed_user=user_to_unfollow).delete()
+                    pin_to_primary(request)
                     messages.success(request, f"Vous vous êtes désabonné de {unfollow_username}.")
                 else:
                     return HttpResponseForbidden("Vous ne pouvez pas vous désabonner de vous-même.")
             except User.DoesNotExist:
                 messages.error(request, "L'utilisateur n'existe pas.")
     return redirect("subscribe")
+
+
+@login_required
+def subscribe_bulk(request):
+    """
+    Handles subscriptions and unsubscriptions to a list of users in one request.
+
+    Accepts the BulkUserFollowsForm fields, either form encoded or as a JSON object such as
+    {"usernames": ["alice", "bob"], "action": "follow"}. JSON requests get a JSON response with the
+    result, form requests are redirected to the subscribe page with a message.
+    """
+    if request.method != "POST":
+        return redirect("subscribe")
+    is_json = request.content_type == "application/json"
+    if is_json:
+        try:
+            data = json.loads(request.body)
+            usernames = data.get("usernames", [])
+        except (ValueError, AttributeError):
+            return JsonResponse({"errors": "Requête JSON invalide."}, status=400)
+        if not isinstance(usernames, list) or not all(isinstance(username, str) for username in usernames):
+            return JsonResponse({"errors": "usernames doit être une liste de noms d'utilisateurs."}, status=400)
+        data = {"usernames": "\n".join(usernames), "action": data.get("action", "follow")}
+    else:
+        data = request.POST
+    form = forms.BulkUserFollowsForm(data)
+    if not form.is_valid():
+        if is_json:
+            return JsonResponse({"errors": form.errors}, status=400)
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect("subscribe")
+
+    usernames = form.cleaned_data["usernames"]
+    if form.cleaned_data["action"] == "follow":
+        followed, missing = follows.follow_users(request.user, usernames)
+        result = {"followed": followed, "missing": missing}
+        message = f"Vous êtes abonné à {len(followed)} utilisateur(s)."
+        if missing:
+            message += f" Utilisateurs introuvables : {', '.join(missing[:20])}."
+    else:
+        unfollowed = follows.unfollow_users(request.user, usernames)
+        result = {"unfollowed": unfollowed}
+        message = f"Vous vous êtes désabonné de {unfollowed} utilisateur(s)."
+    pin_to_primary(request)
+    if is_json:
+        return JsonResponse(result)
+    messages.success(request, message)
+    return redirect("subscribe")
+
+
+@login_required
+@read_from_replica
+def stats(request):
+    """
+    Renders the number of tickets and reviews of the logged-in user per month, the average rating they gave
+    and their most followed followers.
+
+    The counts are read from the daily statistics rows of the user, not from the tickets and reviews.
+    """
+    daily_stats = models.UserDailyStats.objects.filter(user=request.user)
+    months = (
+        daily_stats.annotate(month=TruncMonth("day"))
+        .values("month")
+        .annotate(tickets=Sum("tickets"), reviews=Sum("reviews"))
+        .order_by("-month")
+    )
+    totals = daily_stats.aggregate(tickets=Sum("tickets"), reviews=Sum("reviews"), rating_total=Sum("rating_total"))
+    average_rating = totals["rating_total"] / totals["reviews"] if totals["reviews"] else None
+    top_followers = (
+        User.objects.filter(following__followed_user=request.user)
+        .annotate(followers_count=Count("followed_by"))
+        .order_by("-followers_count", "username")[: settings.STATS_TOP_FOLLOWERS]
+    )
+    context = {
+        "months": months,
+        "totals": totals,
+        "average_rating": average_rating,
+        "top_followers": top_followers,
+    }
+    return render(request, "blog/stats.html", context)
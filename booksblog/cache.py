@@ -0,0 +1,324 @@
+"""
+This module defines the two-tier cache of the project and its stampede protection.
+
+TwoTierCache keeps a small LRU cache in the memory of each process in front of a shared cache (file based,
+or Redis when configured) named by its SHARED option. Values read from the shared cache are kept locally
+for at most LOCAL_TIMEOUT seconds, which bounds how long a process can see a value overwritten by another
+process. Writes go to both tiers.
+
+get_or_compute() protects expensive values against cache stampedes: the value is recomputed a little before
+its expiry with a probability growing as the expiry gets closer, and only one caller recomputes it at a
+time while the others keep using the previous value.
+
+The local tier hands the very object it stores to every thread of the process: cached values must be
+treated as read-only.
+
+Contents:
+    - TwoTierCache: Cache backend with a per-process LRU tier in front of a shared cache.
+    - get_or_compute(key, compute, timeout, alias): Returns a cached value, recomputing it at most once at a time.
+    - cache_stats(): Returns the statistics of the two-tier caches of this process.
+    - shared_lock(key, alias, wait, timeout): Context manager holding a lock shared by all the processes.
+"""
+
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows, development only.
+    fcntl = None
+
+MISSING = object()
+
+# Local tiers and their statistics, by LOCATION, shared by the cache instances of all the threads.
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+
+class LocalStore:
+    def __init__(self, max_entries):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = options.get("SHARED", "shared")
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        with _local_stores_lock:
+            self.store = _local_stores.setdefault(location, LocalStore(options.get("LOCAL_MAX_ENTRIES", 1000)))
+        self.stats = self.store.stats
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_get(self, key):
+        with self.store.lock:
+            entry = self.store.entries.get(key, MISSING)
+            if entry is MISSING:
+                return MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.store.entries[key]
+                return MISSING
+            self.store.entries.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, timeout):
+        local_timeout = self.local_timeout
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        if local_timeout <= 0:
+            self._local_delete(key)
+            return
+        with self.store.lock:
+            self.store.entries[key] = (time.monotonic() + local_timeout, value)
+            self.store.entries.move_to_end(key)
+            while len(self.store.entries) > self.store.max_entries:
+                self.store.entries.popitem(last=False)
+                self.stats["local_evictions"] += 1
+
+    def _local_delete(self, key):
+        with self.store.lock:
+            self.store.entries.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self._local_get(local_key)
+        if value is not MISSING:
+            self.stats["local_hits"] += 1
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self.stats["misses"] += 1
+            return default
+        self.stats["shared_hits"] += 1
+        self._local_set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._local_get(self.make_and_validate_key(key, version))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.stats["local_hits"] += len(found)
+        if missing:
+            shared_found = self.shared.get_many(missing, version=version)
+            self.stats["shared_hits"] += len(shared_found)
+            self.stats["misses"] += len(missing) - len(shared_found)
+            for key, value in shared_found.items():
+                self._local_set(self.make_and_validate_key(key, version), value, self.local_timeout)
+            found.update(shared_found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_and_validate_key(key, version), value, timeout)
+        self.stats["sets"] += 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_and_validate_key(key, version)) is not MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self.store.lock:
+            self.store.entries.clear()
+        self.shared.clear()
+
+    def _timeout(self, timeout):
+        # Timeouts stay relative durations here, the shared cache converts them itself.
+        if timeout is DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return None if timeout is None else max(0, timeout)
+
+
+# Striped locks serializing the recomputation of a value by the threads of the process.
+_compute_locks = [threading.Lock() for _ in range(64)]
+
+
+def _compute_lock(key):
+    return _compute_locks[hash(key) % len(_compute_locks)]
+
+
+def _should_recompute(entry, beta=1.0):
+    # Probabilistic early expiration: the closer the expiry and the longer the computation,
+    # the more likely a caller is to recompute the value before it expires.
+    delta = entry["delta"]
+    return time.time() - delta * beta * math.log(1 - random.random()) >= entry["expires"]
+
+
+def get_or_compute(key, compute, timeout, alias="default"):
+    """
+    Returns the value cached under key, computing it with compute() when it is missing or about to expire.
+
+    Only one caller, across the threads and the processes sharing the cache, recomputes the value at a time,
+    under shared_lock(). A value about to expire keeps being returned to the others meanwhile; a missing value
+    is waited for. The expiry gets a random jitter of up to 10% so that values cached together do not expire
+    together. The threads of a process may be handed the same object: the returned value must not be mutated.
+    """
+    cache = caches[alias]
+    entry = cache.get(key)
+    if entry is not None and not _should_recompute(entry):
+        return entry["value"]
+
+    lock = _compute_lock(key)
+    if not lock.acquire(blocking=entry is None):
+        _record(cache, "stale_served")
+        return entry["value"]
+    try:
+        if entry is None:
+            with shared_lock(key, alias):
+                entry = cache.get(key)
+                if entry is not None:
+                    # Computed by another thread or process while this one was waiting for the lock.
+                    return entry["value"]
+                return _compute(cache, key, compute, timeout)
+        with shared_lock(key, alias, wait=0, timeout=max(1, math.ceil(entry["delta"] * 2))) as acquired:
+            if not acquired:
+                # Another process is already recomputing the value.
+                _record(cache, "stale_served")
+                return entry["value"]
+            return _compute(cache, key, compute, timeout)
+    finally:
+        lock.release()
+
+
+def _compute(cache, key, compute, timeout):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    jittered_timeout = timeout * (1 - random.uniform(0, 0.1))
+    cache.set(key, {"value": value, "delta": delta, "expires": time.time() + jittered_timeout}, timeout)
+    _record(cache, "recomputes")
+    return value
+
+
+def _record(cache, name):
+    if isinstance(cache, TwoTierCache):
+        cache.stats[name] += 1
+
+
+def cache_stats():
+    """
+    Returns a list of dicts with the statistics of each two-tier cache of this process.
+    """
+    stats = []
+    for location, store in _local_stores.items():
+        hits = store.stats["local_hits"] + store.stats["shared_hits"]
+        lookups = hits + store.stats["misses"]
+        stats.append(
+            {
+                "location": location,
+                "local_entries": len(store.entries),
+                "local_max_entries": store.max_entries,
+                "hit_ratio": hits / lookups if lookups else None,
+                "counters": dict(store.stats),
+            }
+        )
+    return stats
+
+
+# Lock files of the file based caches, hashed into a bounded number of stripes.
+LOCK_STRIPES = 256
+LOCK_POLL_INTERVAL = 0.002
+
+
+def _acquire(try_acquire, wait):
+    deadline = None if wait is None else time.monotonic() + wait
+    while not try_acquire():
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(LOCK_POLL_INTERVAL)
+    return True
+
+
+@contextmanager
+def _file_lock(cache, key, wait):
+    directory = os.path.join(cache._dir, "locks")
+    os.makedirs(directory, exist_ok=True)
+    stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    fd = os.open(os.path.join(directory, f"{stripe}.lock"), os.O_RDWR | os.O_CREAT)
+    try:
+
+        def try_acquire():
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+
+        acquired = _acquire(try_acquire, wait)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _cache_lock(cache, key, wait, timeout):
+    lock_key = f"{key}:lock"
+    acquired = _acquire(lambda: cache.add(lock_key, 1, timeout), wait)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def shared_lock(key, alias="default", wait=None, timeout=10):
+    """
+    Returns a context manager locking key for all the processes sharing the cache alias, and yielding whether
+    the lock was acquired within wait seconds (None waits as long as needed).
+
+    With a file based cache, the lock is an flock() on a file next to the cache, released even if the process
+    dies. With Redis or Memcached, it is a cache key set with the atomic add() and expiring after timeout seconds.
+    The shared tier of a two-tier cache is used.
+    """
+    cache = caches[alias]
+    if isinstance(cache, TwoTierCache):
+        cache = cache.shared
+    if isinstance(cache, FileBasedCache) and fcntl is not None:
+        return _file_lock(cache, key, wait)
+    return _cache_lock(cache, key, wait, timeout)
@@ -0,0 +1,38 @@
+"""
+This module defines views whose module is imported on their first request.
+
+The URLconf refers to the views through LazyView so that booting a worker does not import every view
+module. In the preloaded deployment mode, preload_views() imports them all in the master process
+before the workers are forked, so the workers share these modules instead of loading them again.
+
+Contents:
+    - LazyView: View importing its dotted path on first call.
+    - preload_views(): Imports every LazyView.
+"""
+
+from django.utils.module_loading import import_string
+
+_lazy_views = []
+
+
+class LazyView:
+    def __init__(self, dotted_path):
+        self.dotted_path = dotted_path
+        self.view = None
+        _lazy_views.append(self)
+
+    def __repr__(self):
+        return f"LazyView({self.dotted_path!r})"
+
+    def load(self):
+        if self.view is None:
+            self.view = import_string(self.dotted_path)
+        return self.view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.load()(request, *args, **kwargs)
+
+
+def preload_views():
+    for lazy_view in _lazy_views:
+        lazy_view.load()
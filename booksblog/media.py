@@ -0,0 +1,89 @@
+"""
+This module defines how the uploaded media files are addressed and served.
+
+The URLs of the media files are signed and expire, so that only the pages of the site hand them out. The
+expiry is rounded up to the next multiple of settings.MEDIA_URL_LIFETIME, so a file keeps the same URL
+for a whole period and browsers and proxies can cache it. The URL also carries the modification time of
+the file, so a file rewritten in place (resized by a job, reprocessed by rerender_images) gets a new
+URL instead of an outdated cached copy. The serve view checks the signature, then lets the front server
+send the file (X-Accel-Redirect for nginx, X-Sendfile for Apache), which also answers range and
+conditional requests, so workers never stream file contents. Django sends the file itself only in the
+"django" mode, meant for development.
+
+Contents:
+    - SignedMediaStorage: File system storage returning signed, expiring URLs.
+    - serve(request, path): Checks the signature of a media URL and has the file sent.
+"""
+
+import mimetypes
+import math
+import os
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.signing import Signer
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views import static
+
+_signer = Signer(salt="booksblog.media")
+
+
+def _signature(name, expires, version):
+    return _signer.signature(f"{name}:{expires}:{version}")
+
+
+def _version(storage, name):
+    try:
+        return f"{os.stat(storage.path(name)).st_mtime_ns:x}"
+    except OSError:
+        return "0"
+
+
+class SignedMediaStorage(FileSystemStorage):
+    def url(self, name):
+        url = super().url(name)
+        lifetime = settings.MEDIA_URL_LIFETIME
+        # Rounded up so the URL, and the cached copies of the file, stay the same for a whole period.
+        expires = math.ceil((time.time() + lifetime) / lifetime) * lifetime
+        version = _version(self, name)
+        return f"{url}?{urlencode({'e': expires, 'v': version, 's': _signature(name, expires, version)})}"
+
+
+def serve(request, path):
+    """
+    Sends the media file path if the URL carries a valid signature that has not expired.
+
+    Depending on settings.MEDIA_SERVE_MODE, the file is sent by nginx ("accel"), by Apache ("sendfile")
+    or by Django ("django"). The response may be cached until the URL expires, unless the file changed since
+    the URL was issued.
+    """
+    try:
+        expires = int(request.GET["e"])
+        version = request.GET["v"]
+        signature = request.GET["s"]
+    except (KeyError, ValueError):
+        return HttpResponseForbidden()
+    max_age = expires - int(time.time())
+    if max_age <= 0 or not constant_time_compare(signature, _signature(path, expires, version)):
+        return HttpResponseForbidden()
+    if not default_storage.exists(path):
+        raise Http404
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == "accel":
+        response = HttpResponse(content_type=mimetypes.guess_type(path)[0])
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    elif mode == "sendfile":
+        response = HttpResponse(content_type=mimetypes.guess_type(path)[0])
+        response["X-Sendfile"] = default_storage.path(path)
+    else:
+        response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    if version == _version(default_storage, path):
+        response["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    else:
+        # The file changed since the URL was issued: the page holding it gets the new URL when reloaded.
+        response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,264 @@
+"""
+This module profiles individual requests on demand, for staff users only.
+
+A staff user adds ?profile=1 (or ?profile=sample) to a URL, or sends the X-Profile header with the same
+values, to run the view of a module listed in settings.PROFILE_VIEW_MODULES under a profiler:
+
+    - "1": the deterministic profiler (cProfile), saved as a .prof file for pstats, snakeviz or flameprof.
+    - "sample": a sampling profiler recording the stack of the request thread every
+      settings.PROFILE_SAMPLE_INTERVAL seconds, saved as collapsed stacks (.folded) for flamegraph.pl
+      or speedscope.
+
+The SQL queries with their durations and the phases timed with phase() (Pillow, templates) are saved
+next to the profile in a .json file. Streamed responses are profiled until their last chunk is sent.
+The files are kept in settings.PROFILE_DIR and listed for download on the profiles page.
+
+Contents:
+    - phase(name): Context manager timing a phase of the request being profiled.
+    - ProfilingMiddleware: Middleware profiling the requests asking for it.
+    - ProfiledStream: Streamed content produced under the profile of its request.
+    - profiles(request): Lists the saved profiles.
+    - profile_download(request, name): Downloads a saved profile.
+"""
+
+import cProfile
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.decorators import user_passes_test
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils import timezone
+
+_current = ContextVar("profile", default=None)
+
+EXTENSIONS = (".prof", ".folded", ".json")
+
+
+@contextmanager
+def phase(name):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases.append(
+            {
+                "name": name,
+                "start_ms": (started - profile.started) * 1000,
+                "duration_ms": (time.perf_counter() - started) * 1000,
+            }
+        )
+
+
+class Sampler(threading.Thread):
+    """
+    Thread recording the stack of another thread at a fixed interval, as collapsed stacks.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_filename}:{frame.f_code.co_qualname}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.items():
+                file.write(f"{stack} {count}\n")
+
+
+class Profile:
+    def __init__(self, request, view, mode):
+        self.name = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.request_info = {"path": request.get_full_path(), "user": request.user.username, "view": view}
+        self.mode = mode
+        self.queries = []
+        self.phases = []
+        self.exit_stack = ExitStack()
+        self.finished = False
+
+    def start(self):
+        for connection in connections.all():
+            self.exit_stack.enter_context(connection.execute_wrapper(self.record_query(connection.alias)))
+        if self.mode == "sample":
+            self.profiler = Sampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = time.perf_counter()
+        return _current.set(self)
+
+    def record_query(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append(
+                    {
+                        "alias": alias,
+                        "sql": sql,
+                        "start_ms": (started - self.started) * 1000,
+                        "duration_ms": (time.perf_counter() - started) * 1000,
+                    }
+                )
+
+        return wrapper
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        duration = time.perf_counter() - self.started
+        if self.mode == "sample":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        self.exit_stack.close()
+
+        profile_dir = settings.PROFILE_DIR
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        if self.mode == "sample":
+            self.profiler.dump(profile_dir / f"{self.name}.folded")
+        else:
+            self.profiler.dump_stats(profile_dir / f"{self.name}.prof")
+        log = {
+            **self.request_info,
+            "mode": self.mode,
+            "duration_ms": duration * 1000,
+            "sql_ms": sum(query["duration_ms"] for query in self.queries),
+            "queries": self.queries,
+            "phases": self.phases,
+        }
+        with open(profile_dir / f"{self.name}.json", "w", encoding="utf-8") as file:
+            json.dump(log, file, indent=2)
+        _prune(profile_dir)
+
+
+def _prune(profile_dir):
+    logs = sorted(profile_dir.glob("*.json"))
+    for log in logs[: max(0, len(logs) - settings.PROFILE_KEEP)]:
+        for extension in EXTENSIONS:
+            log.with_suffix(extension).unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests of staff users asking for it with the profile query parameter or the X-Profile header.
+
+    The profile starts in process_view, once the view is known, and ends when the response, streamed or not,
+    is fully produced. The name of the saved profile is returned in the X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profiling = getattr(request, "_profiling", None)
+        if profiling is None:
+            return response
+        profile, token = profiling
+        _current.reset(token)
+        response["X-Profile-Id"] = profile.name
+        if response.streaming:
+            response.streaming_content = ProfiledStream(profile, response.streaming_content)
+        else:
+            profile.finish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = request.GET.get("profile") or request.headers.get("X-Profile")
+        if mode not in ("1", "sample") or not request.user.is_staff:
+            return None
+        # The URLconf refers to most views through LazyView, which knows the dotted path of its view.
+        view = getattr(view_func, "dotted_path", None) or f"{view_func.__module__}.{view_func.__qualname__}"
+        if not view.startswith(tuple(f"{module}." for module in settings.PROFILE_VIEW_MODULES)):
+            return None
+        profile = Profile(request, view, mode)
+        request._profiling = (profile, profile.start())
+        return None
+
+
+class ProfiledStream:
+    """
+    Streamed content whose chunks are produced under the profile of the request, which ends when the content
+    is exhausted or closed.
+    """
+
+    def __init__(self, profile, content):
+        self.profile = profile
+        self.iterator = iter(content)
+        self.content = content
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = _current.set(self.profile)
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.profile.finish()
+            raise
+        finally:
+            _current.reset(token)
+
+    def close(self):
+        if hasattr(self.content, "close"):
+            self.content.close()
+        self.profile.finish()
+
+
+def _is_staff(user):
+    return user.is_staff
+
+
+@user_passes_test(_is_staff)
+def profiles(request):
+    """
+    Renders the list of the saved profiles, newest first, with the summary of their query logs.
+    """
+    saved = []
+    for log in sorted(settings.PROFILE_DIR.glob("*.json"), reverse=True) if settings.PROFILE_DIR.exists() else []:
+        with open(log, encoding="utf-8") as file:
+            summary = json.load(file)
+        files = [log.with_suffix(extension).name for extension in EXTENSIONS if log.with_suffix(extension).exists()]
+        saved.append({"summary": summary, "queries_count": len(summary["queries"]), "files": files})
+    return render(request, "profiling/profiles.html", {"profiles": saved})
+
+
+@user_passes_test(_is_staff)
+def profile_download(request, name):
+    path = settings.PROFILE_DIR / name
+    if path.suffix not in EXTENSIONS or path.name != name or not path.exists():
+        raise Http404
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
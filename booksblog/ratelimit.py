@@ -0,0 +1,143 @@
+"""
+This module provides a token bucket rate limiter for the views that write content.
+
+Each rate limited view belongs to a group configured in settings.RATELIMITS as "<count>/<period>",
+for example "10/m": a bucket holds up to <count> tokens and refills at <count> tokens per <period>.
+Requests are limited per user and per IP address; behind settings.RATELIMIT_TRUSTED_PROXIES reverse
+proxies, the address of the client is read from X-Forwarded-For. Buckets are stored in the cache named
+by settings.RATELIMIT_CACHE so that all the workers share them, each update of a bucket holding a lock
+shared by the workers (see booksblog.cache.shared_lock); when this cache is unavailable the buckets fall
+back to the memory of the current process.
+
+Contents:
+    - parse_rate(rate): Converts "10/m" into (capacity, tokens per second).
+    - take_token(key, capacity, refill_rate): Consumes a token, returns the seconds to wait or 0.
+    - client_ip(request): Returns the IP address of the client, behind the trusted proxies.
+    - ratelimit(group, methods): Decorator returning a 429 response when a bucket is empty.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from booksblog.cache import shared_lock
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+LOCAL_MAX_BUCKETS = 10000
+LOCK_WAIT = 0.1
+
+_local_buckets = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    count, period = rate.split("/")
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+def _refill(bucket, capacity, refill_rate, now):
+    if bucket is None:
+        return float(capacity)
+    tokens, updated = bucket
+    return min(float(capacity), tokens + (now - updated) * refill_rate)
+
+
+def _take_local(key, capacity, refill_rate, now):
+    with _local_lock:
+        tokens = _refill(_local_buckets.pop(key, None), capacity, refill_rate, now)
+        allowed = tokens >= 1
+        _local_buckets[key] = (tokens - 1 if allowed else tokens, now)
+        while len(_local_buckets) > LOCAL_MAX_BUCKETS:
+            _local_buckets.popitem(last=False)
+    return allowed, tokens
+
+
+def _take_shared(key, capacity, refill_rate, now):
+    cache = caches[settings.RATELIMIT_CACHE]
+    with shared_lock(key, settings.RATELIMIT_CACHE, wait=LOCK_WAIT, timeout=1) as acquired:
+        if not acquired:
+            # Requests hitting the same bucket in parallel for so long are a burst: they are refused.
+            return False, 0.0
+        now = time.time()
+        tokens = _refill(cache.get(key), capacity, refill_rate, now)
+        allowed = tokens >= 1
+        timeout = math.ceil(capacity / refill_rate) + 1
+        cache.set(key, (tokens - 1 if allowed else tokens, now), timeout)
+    return allowed, tokens
+
+
+def take_token(key, capacity, refill_rate):
+    """
+    Consumes a token from the bucket identified by key.
+
+    Returns 0 when the request is allowed, otherwise the number of seconds before a token is available.
+    """
+    now = time.time()
+    try:
+        allowed, tokens = _take_shared(key, capacity, refill_rate, now)
+    except Exception:
+        logger.warning("Rate limit cache unavailable, using the local buckets.", exc_info=True)
+        allowed, tokens = _take_local(key, capacity, refill_rate, now)
+    if allowed:
+        return 0
+    return max(1, math.ceil((1 - tokens) / refill_rate))
+
+
+def client_ip(request):
+    """
+    Returns the IP address of the client, read from X-Forwarded-For behind settings.RATELIMIT_TRUSTED_PROXIES
+    reverse proxies, each of them appending the address it received the request from.
+    """
+    address = request.META.get("REMOTE_ADDR", "")
+    proxies = settings.RATELIMIT_TRUSTED_PROXIES
+    if proxies:
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+        forwarded = [part.strip() for part in forwarded if part.strip()]
+        if forwarded:
+            # The addresses before the one added by the outermost trusted proxy are chosen by the client.
+            address = forwarded[-min(proxies, len(forwarded))]
+    return address
+
+
+def _client_keys(request, group):
+    keys = [f"ratelimit:{group}:ip:{client_ip(request)}"]
+    if request.user.is_authenticated:
+        keys.append(f"ratelimit:{group}:user:{request.user.pk}")
+    return keys
+
+
+def ratelimit(group, methods=("POST",)):
+    """
+    Limits the requests made to the decorated view with the rate configured for group.
+
+    Only the given HTTP methods consume tokens, so displaying a form is never limited.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATELIMITS.get(group)
+            if rate and request.method in methods:
+                capacity, refill_rate = parse_rate(rate)
+                retry_after = max(take_token(key, capacity, refill_rate) for key in _client_keys(request, group))
+                if retry_after:
+                    response = HttpResponse(
+                        "Trop de requêtes, veuillez réessayer plus tard.", status=429, content_type="text/plain"
+                    )
+                    response["Retry-After"] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
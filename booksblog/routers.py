@@ -0,0 +1,84 @@
+"""
+This module routes read-only queries to the database replicas.
+
+Reads go to a replica only inside views decorated with read_from_replica, and only for GET and HEAD
+requests: a form posted to such a view validates against the data it is about to write, which a lagging
+replica may not have yet. Every other query uses the 'default' database. After a user writes something,
+pin_to_primary() sets a short-lived cookie so that the following requests of this user read from
+'default' until the replicas have caught up.
+
+Contents:
+    - ReplicaRouter: Database router sending reads to a random replica when allowed.
+    - read_from_replica(view): Decorator allowing a view to read from the replicas.
+    - pin_to_primary(request): Makes the next requests of the user read from the primary database.
+    - ReplicaPinningMiddleware: Applies and renews the pinning cookie.
+"""
+
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE_NAME = "pin_primary"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_pinned = ContextVar("pinned_to_primary", default=False)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a replica inside read_from_replica views, and everything else to 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and _replica_reads.get() and not _pinned.get():
+            return random.choice(aliases)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapper
+
+
+def pin_to_primary(request):
+    request.pin_to_primary = True
+    _pinned.set(True)
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(PIN_COOKIE_NAME in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        if getattr(request, "pin_to_primary", False) and replicas():
+            response.set_cookie(
+                PIN_COOKIE_NAME, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+            )
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,8 +29,10 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# The admin can be disabled on the public workers with BOOKSBLOG_ADMIN=0, so they do not load it.
+ADMIN_ENABLED = os.environ.get("BOOKSBLOG_ADMIN", "1") == "1"
+
 INSTALLED_APPS = [
-    "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -39,12 +42,17 @@ INSTALLED_APPS = [
     "blog",
 ]
 
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, "django.contrib.admin")
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "booksblog.routers.ReplicaPinningMiddleware",
+    "booksblog.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -81,6 +89,66 @@ DATABASES = {
     }
 }
 
+# Read replicas, as a comma separated list of SQLite files in BOOKSBLOG_REPLICAS.
+# GET requests of the read-only views (home, posts, subscribe, ...) query a random replica; users who just wrote
+# something read from 'default' for REPLICA_PIN_SECONDS.
+
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.environ.get("BOOKSBLOG_REPLICAS", "").split(",")), start=1):
+    alias = f"replica{index}"
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["booksblog.routers.ReplicaRouter"]
+
+REPLICA_PIN_SECONDS = 10
+
+# Rate limits of the views creating content, as "<count>/<s|m|h|d>" token buckets
+# applied per user and per IP address.
+
+RATELIMIT_CACHE = "shared"
+
+# Number of reverse proxies (nginx, load balancer) in front of the application, which append the address
+# of their client to X-Forwarded-For. 0 when the application is reached directly.
+
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get("BOOKSBLOG_TRUSTED_PROXIES", "0"))
+
+RATELIMITS = {
+    "content": "10/m",
+    "signup": "5/h",
+}
+
+# Cache
+# A per-process LRU tier in front of a shared cache: files in BASE_DIR / "cache", or Redis when
+# BOOKSBLOG_REDIS_URL is set. See booksblog/cache.py.
+
+CACHES = {
+    "default": {
+        "BACKEND": "booksblog.cache.TwoTierCache",
+        "LOCATION": "default",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "LOCAL_MAX_ENTRIES": 1000,
+            "LOCAL_TIMEOUT": 5,
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+if os.environ.get("BOOKSBLOG_REDIS_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["BOOKSBLOG_REDIS_URL"],
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -125,5 +193,99 @@ LOGIN_URL = "login"
 
 LOGIN_REDIRECT_URL = "home"
 
+# Feeds of the home and posts pages: items per page, rows read from the database per query chunk,
+# cards sent per streamed chunk, and whether the page is streamed or rendered at once.
+
+FEED_STREAMING = True
+
+FEED_PAGE_SIZE = 50
+
+FEED_CHUNK_SIZE = 200
+
+FEED_CARDS_PER_CHUNK = 20
+
+# Cached head of the home feed of each user: cache alias, number of items kept, and how far before
+# the newest cached item the new items are looked for.
+
+FEED_CACHE = "default"
+
+FEED_CACHE_ITEMS = 200
+
+FEED_CACHE_OVERLAP_SECONDS = 30
+
+# Ticket detail page: cache alias and timeout of the pages of reviews, and number of reviews per page.
+
+TICKET_CACHE = "default"
+
+TICKET_CACHE_TIMEOUT = 600
+
+TICKET_REVIEWS_PAGE_SIZE = 20
+
+# Uploaded images whose perceptual hash differs by at most this many bits (3 at most) from the image
+# of an existing ticket are reported as duplicates.
+
+DUPLICATE_IMAGE_MAX_DISTANCE = 3
+
+# Tickets and reviews older than this are moved to the archive tables by "manage.py archive_posts".
+
+ARCHIVE_AFTER_DAYS = 365
+
+# Number of followers listed, most followed first, on the statistics page.
+
+STATS_TOP_FOLLOWERS = 10
+
+# Job queue run by "manage.py run_jobs": attempts before a job fails, seconds a claimed job stays
+# invisible to the other workers, exponential backoff between attempts, and days done jobs are kept.
+# With JOBS_RUN_EAGERLY, jobs also run in the request right after the commit, for development without a worker.
+
+JOBS_MAX_ATTEMPTS = 5
+
+JOBS_VISIBILITY_TIMEOUT = 300
+
+JOBS_BACKOFF_SECONDS = 10
+
+JOBS_BACKOFF_MAX_SECONDS = 3600
+
+JOBS_KEEP_DONE_DAYS = 7
+
+JOBS_RUN_EAGERLY = os.environ.get("BOOKSBLOG_JOBS_EAGER", "0") == "1"
+
+# Maximum number of usernames followed or unfollowed in one bulk request.
+
+BULK_FOLLOW_MAX_USERNAMES = 10000
+
+# Cold start budget checked by "manage.py startup_profile": time to load the WSGI application
+# and the URLconf, and peak memory of the booted process.
+
+STARTUP_BUDGET_MS = 1000
+
+STARTUP_MEMORY_BUDGET_MB = 100
+
+# On-demand profiling of the requests of staff users (see booksblog/profiling.py): profiled view modules,
+# interval of the sampling profiler, directory of the saved profiles and number of profiles kept.
+
+PROFILE_VIEW_MODULES = ["blog.views", "authentication.views"]
+
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+PROFILE_DIR = BASE_DIR.joinpath("profiles/")
+
+PROFILE_KEEP = 100
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR.joinpath("media/")
+
+# Uploaded files get signed URLs valid for at least MEDIA_URL_LIFETIME seconds (see booksblog/media.py).
+# MEDIA_SERVE_MODE tells who sends the files: "accel" (nginx, through the internal location
+# MEDIA_ACCEL_PREFIX), "sendfile" (Apache mod_xsendfile) or "django" (development only).
+
+STORAGES = {
+    "default": {"BACKEND": "booksblog.media.SignedMediaStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+MEDIA_URL_LIFETIME = 86400
+
+MEDIA_SERVE_MODE = os.environ.get("BOOKSBLOG_MEDIA_SERVE_MODE", "django")
+
+MEDIA_ACCEL_PREFIX = "/protected-media/"
@@ -14,36 +14,44 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path
 from django.contrib.auth.views import LoginView
-from django.conf.urls.static import static
 from django.conf import settings
-import authentication.views
-import blog.views
+from booksblog.lazy import LazyView
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path(
         "",
         LoginView.as_view(template_name="authentication/login.html", redirect_authenticated_user=True),
         name="login",
     ),
-    path("logout/", authentication.views.logout_user, name="logout"),
-    path("home/", blog.views.home, name="home"),
-    path("signup/", authentication.views.signup_page, name="signup"),
-    path("ticket_review/create/", blog.views.ticket_and_review, name="ticket_and_review_create"),
-    path("ticket/create/", blog.views.ticket_create, name="ticket_create"),
-    path("ticket/request/", blog.views.ticket_request, name="ticket_request"),
-    path("ticket/<int:ticket_id>/edit", blog.views.ticket_edit, name="ticket_edit"),
-    path("ticket/<int:ticket_id>/delete/", blog.views.ticket_delete, name="ticket_delete"),
-    path("review/<int:ticket_id>/create/", blog.views.review_create, name="review_create"),
-    path("review/<int:review_id>/edit/", blog.views.review_edit, name="review_edit"),
-    path("review/<int:review_id>/delete/", blog.views.review_delete, name="review_delete"),
-    path("subscribe/", blog.views.subscribe, name="subscribe"),
-    path("unsubscribe/", blog.views.unsubscribe, name="unsubscribe"),
-    path("posts/", blog.views.posts, name="posts"),
+    path("logout/", LazyView("authentication.views.logout_user"), name="logout"),
+    path("home/", LazyView("blog.views.home"), name="home"),
+    path("signup/", LazyView("authentication.views.signup_page"), name="signup"),
+    path("ticket_review/create/", LazyView("blog.views.ticket_and_review"), name="ticket_and_review_create"),
+    path("ticket/create/", LazyView("blog.views.ticket_create"), name="ticket_create"),
+    path("ticket/request/", LazyView("blog.views.ticket_request"), name="ticket_request"),
+    path("ticket/<int:ticket_id>/", LazyView("blog.views.ticket_detail"), name="ticket_detail"),
+    path("ticket/<int:ticket_id>/edit", LazyView("blog.views.ticket_edit"), name="ticket_edit"),
+    path("ticket/<int:ticket_id>/delete/", LazyView("blog.views.ticket_delete"), name="ticket_delete"),
+    path("review/<int:ticket_id>/create/", LazyView("blog.views.review_create"), name="review_create"),
+    path("review/<int:review_id>/edit/", LazyView("blog.views.review_edit"), name="review_edit"),
+    path("review/<int:review_id>/delete/", LazyView("blog.views.review_delete"), name="review_delete"),
+    path("subscribe/", LazyView("blog.views.subscribe"), name="subscribe"),
+    path("unsubscribe/", LazyView("blog.views.unsubscribe"), name="unsubscribe"),
+    path("subscribe/bulk/", LazyView("blog.views.subscribe_bulk"), name="subscribe_bulk"),
+    path("posts/", LazyView("blog.views.posts"), name="posts"),
+    path("stats/", LazyView("blog.views.stats"), name="stats"),
+    path("profiles/", LazyView("booksblog.profiling.profiles"), name="profiles"),
+    path("profiles/<str:name>", LazyView("booksblog.profiling.profile_download"), name="profile_download"),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", LazyView("booksblog.media.serve"), name="media"),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+    from blog.admin import cache_stats_view
+
+    urlpatterns[:0] = [
+        path("admin/cache-stats/", admin.site.admin_view(cache_stats_view), name="cache_stats"),
+        path("admin/", admin.site.urls),
+    ]
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "booksblog.settings")
 
 application = get_wsgi_application()
+
+if os.environ.get("BOOKSBLOG_PRELOAD") == "1":
+    # Preloaded deployment mode: the master process imports the views before forking the workers,
+    # which then share these modules copy-on-write instead of importing them on their first request.
+    from django.urls import get_resolver
+    from booksblog.lazy import preload_views
+
+    get_resolver().url_patterns
+    preload_views()
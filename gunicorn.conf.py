@@ -0,0 +1,13 @@
+"""
+Gunicorn configuration for booksblog.
+
+Run with "gunicorn -c gunicorn.conf.py booksblog.wsgi". With BOOKSBLOG_PRELOAD=1 the application is
+loaded once in the master process and the workers are forked from it, see booksblog/wsgi.py.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+preload_app = os.environ.get("BOOKSBLOG_PRELOAD") == "1"